@@ -0,0 +1,174 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+import results
+
+# Статистика теста для создателя по всем попыткам из журнала.
+# Ответы теста хранятся по столбцам: для каждого вопроса - непрерывный массив uint8
+# с номером выбранного варианта в каждой попытке (или UNANSWERED). Все показатели
+# считаются операциями NumPy над этими столбцами целиком, без цикла по попыткам.
+# Матрицы держатся в LRU-кэше и дополняются при каждой новой попытке,
+# журнал перечитывается только при промахе.
+
+UNANSWERED = 255
+ANALYTICS_CACHE_SIZE = int(os.getenv('ANALYTICS_CACHE_SIZE', '32'))  # сколько тестов держать в кэше
+GROUP_SHARE = 0.27  # доля лучших и худших попыток для индекса дискриминации
+MAX_MESSAGE_LENGTH = 4096
+
+
+class AnswerMatrix:
+    """Выбранные варианты всех попыток теста: строка - вопрос, столбец - попытка"""
+
+    def __init__(self, questions: int, rows=()):
+        self.questions = questions
+        if not questions:
+            # Тест без вопросов: reshape(-1, 0) невозможен, храним только число попыток
+            self._data = np.empty((0, sum(1 for _ in rows)), dtype=np.uint8)
+            self._size = self._data.shape[1]
+            return
+        # Строки короче числа вопросов (попытка прервана) дополняются UNANSWERED
+        data = b''.join(row[:questions].ljust(questions, b'\xff') for row in rows)
+        self._data = np.ascontiguousarray(np.frombuffer(data, dtype=np.uint8).reshape(-1, questions).T)
+        self._size = self._data.shape[1]
+
+    def __len__(self):
+        return self._size
+
+    def append(self, row: bytes) -> None:
+        if self._size == self._data.shape[1]:
+            # Удваиваем емкость, чтобы дописывание стоило O(1) в среднем
+            grown = np.empty((self.questions, max(16, 2 * self._size)), dtype=np.uint8)
+            grown[:, :self._size] = self._data[:, :self._size]
+            self._data = grown
+        column = np.full(self.questions, UNANSWERED, dtype=np.uint8)
+        row = bytes(row[:self.questions])
+        column[:len(row)] = np.frombuffer(row, dtype=np.uint8)
+        self._data[:, self._size] = column
+        self._size += 1
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._data[:, :self._size]
+
+
+def compute(answers: np.ndarray, key: np.ndarray, options: int) -> dict:
+    """Показатели теста по матрице ответов (вопрос x попытка) и ключу правильных вариантов.
+
+    difficulty - доля верных ответов среди попыток, где вопрос был задан; discrimination - разница этой доли между
+    лучшими и худшими GROUP_SHARE попыток по общему баллу; choices - сколько раз выбран
+    каждый вариант (вопрос x вариант); skipped - в скольких попытках вопрос не задан
+    (попытка прервана раньше или вопрос не выпал из пула);
+    distribution - число попыток с каждым баллом от 0 до числа вопросов.
+    """
+    questions, attempts = answers.shape
+    if not attempts or not questions:
+        # Нет попыток или вопросов - все попытки (если есть) набрали 0 баллов
+        distribution = np.zeros(questions + 1, dtype=np.int64)
+        distribution[0] = attempts
+        return {'attempts': attempts, 'difficulty': np.zeros(questions), 'discrimination': np.zeros(questions),
+                'choices': np.zeros((questions, options), dtype=np.int64),
+                'skipped': np.zeros(questions, dtype=np.int64),
+                'distribution': distribution, 'mean': 0.0, 'median': 0.0}
+    correct = answers == key[:, None]
+    scores = correct.sum(axis=0, dtype=np.uint16)
+    # Столбцы непрерывны, поэтому частоты вариантов - один bincount на вопрос
+    counts = np.stack([np.bincount(column, minlength=256) for column in answers])
+
+    group = int(attempts * GROUP_SHARE)
+    discrimination = np.zeros(questions)
+    if group:
+        # Лучшие и худшие попытки без полной сортировки: argpartition за O(n)
+        order = np.argpartition(scores, (group, attempts - group - 1))
+        upper = np.zeros(attempts, dtype=bool)
+        lower = np.zeros(attempts, dtype=bool)
+        upper[order[attempts - group:]] = True
+        lower[order[:group]] = True
+        discrimination = (np.count_nonzero(correct & upper, axis=1)
+                          - np.count_nonzero(correct & lower, axis=1)) / group
+    distribution = np.bincount(scores, minlength=questions + 1)
+    return {
+        'attempts': attempts,
+        'difficulty': np.count_nonzero(correct, axis=1) / np.maximum(attempts - counts[:, UNANSWERED], 1),
+        'discrimination': discrimination,
+        'choices': counts[:, :options],
+        'skipped': counts[:, UNANSWERED],
+        'distribution': distribution,
+        'mean': float(distribution @ np.arange(questions + 1)) / attempts,
+        # Медиана по распределению баллов, а не сортировкой попыток
+        'median': float(np.searchsorted(np.cumsum(distribution), (attempts + 1) / 2)),
+    }
+
+
+def report(test_name: str, questions: list, stats: dict, total: int = None) -> list:
+    """Текст статистики, разбитый на сообщения не длиннее лимита Telegram.
+    total - вопросов в одной попытке, если тест выдает их из пула"""
+    attempts = stats['attempts']
+    lines = [f'Статистика теста "{test_name}" по {attempts} попыткам',
+             f'Средний балл: {stats["mean"]:.1f} из {total or len(questions)}, медиана: {stats["median"]:g}',
+             'Распределение баллов: ' + ', '.join(
+                 f'{score}: {count}' for score, count in enumerate(stats['distribution'].tolist()) if count)]
+    for index, question in enumerate(questions):
+        choices = stats['choices'][index].tolist()
+        answered = sum(choices) or 1
+        options = ', '.join(f'{"✓" if option == question["correct_index"] else ""}{answer} - {count / answered:.0%}'
+                            for option, (answer, count) in enumerate(zip(question['answers'], choices)))
+        discrimination = stats['discrimination'][index]
+        if int(attempts * GROUP_SHARE):
+            discrimination = f'{discrimination:+.2f}' + (' (слабо различает сильных и слабых)'
+                                                         if discrimination < 0.2 else '')
+        else:
+            discrimination = 'мало попыток'
+        # Решаемость считается по попыткам, в которых вопрос был задан
+        given = attempts - stats['skipped'][index]
+        difficulty = f'{stats["difficulty"][index]:.0%}' if given else 'нет данных'
+        lines.append(f'\n{index + 1}. {question["text"]}\n'
+                     f'Решаемость: {difficulty}, дискриминация: {discrimination}\n'
+                     f'Ответы: {options}' + (f'\nВопрос не задан: {stats["skipped"][index]}'
+                                             if stats['skipped'][index] else ''))
+
+    messages, current = [], ''
+    for line in lines:
+        if current and len(current) + len(line) + 1 > MAX_MESSAGE_LENGTH:
+            messages.append(current)
+            current = ''
+        current = f'{current}\n{line}' if current else line
+    messages.append(current[:MAX_MESSAGE_LENGTH])
+    return messages
+
+
+class TestAnalytics:
+    """Кэш матриц ответов по тестам поверх журнала попыток"""
+
+    def __init__(self, result_store: results.ResultStore, max_tests: int = ANALYTICS_CACHE_SIZE):
+        self._results = result_store
+        self._max_tests = max_tests
+        self._matrices = OrderedDict()  # test id -> AnswerMatrix
+
+    def record(self, test_id: int, choices: bytes) -> None:
+        """Дописывает попытку, если матрица теста уже в кэше"""
+        matrix = self._matrices.get(test_id)
+        if matrix is not None:
+            matrix.append(choices)
+
+    def matrix(self, test_id: int, questions: int, attempts: int) -> AnswerMatrix:
+        matrix = self._matrices.get(test_id)
+        # Другая реплика бота могла дописать попытки в общий журнал - тогда перечитываем
+        if matrix is None or matrix.questions != questions or len(matrix) != attempts:
+            matrix = AnswerMatrix(questions, self._results.iter_choices(test_id))
+            self._matrices[test_id] = matrix
+        self._matrices.move_to_end(test_id)
+        if len(self._matrices) > self._max_tests:
+            self._matrices.popitem(last=False)
+        return matrix
+
+    def stats(self, test: dict, attempts: int) -> dict:
+        """Показатели теста (словарь из TestStore) по attempts попыткам из журнала"""
+        questions = test['questions']
+        key = np.array([question['correct_index'] for question in questions], dtype=np.uint8)
+        options = max((len(question['answers']) for question in questions), default=0)
+        return compute(self.matrix(test['id'], len(questions), attempts).array, key, options)
+
+    def invalidate(self, test_id: int) -> None:
+        self._matrices.pop(test_id, None)
@@ -0,0 +1,68 @@
+import os
+import time
+import aiohttp
+
+import metrics
+
+# Общие клиенты для модуля авторизации.
+# Создаются один раз при первом обращении и переиспользуются всеми обработчиками,
+# чтобы не блокировать event loop и не открывать соединение на каждый запрос.
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+
+# Таймаут запроса к серверу авторизации (в секундах) и лимит одновременных соединений
+AUTH_TIMEOUT = float(os.getenv('AUTH_TIMEOUT', '10'))
+AUTH_MAX_CONNECTIONS = int(os.getenv('AUTH_MAX_CONNECTIONS', '100'))
+AUTH_KEEPALIVE = float(os.getenv('AUTH_KEEPALIVE', '30'))
+
+_redis = None
+_session = None
+
+
+def get_redis():
+    """Возвращает клиент Redis с общим пулом соединений"""
+    global _redis
+    if _redis is None:
+        # redis загружается при первом обращении: без Redis-настроек бот его не импортирует
+        import redis.asyncio as aioredis
+        from timed_redis import TimedRedis
+        pool = aioredis.BlockingConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
+        _redis = TimedRedis(connection_pool=pool)
+    return _redis
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Возвращает общую HTTP-сессию с keep-alive, таймаутом и лимитом соединений"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=AUTH_MAX_CONNECTIONS, keepalive_timeout=AUTH_KEEPALIVE)
+        timeout = aiohttp.ClientTimeout(total=AUTH_TIMEOUT)
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+
+async def post_json(url: str, payload: dict):
+    """Отправляет POST-запрос через общую сессию. Возвращает (статус, тело ответа или None)"""
+    started = time.perf_counter()
+    status = 'error'  # соединение или таймаут
+    try:
+        async with get_session().post(url, json=payload) as response:
+            status = response.status
+            data = None
+            if response.status == 200:
+                data = await response.json(content_type=None)
+            return response.status, data
+    finally:
+        metrics.AUTH_SECONDS.observe(time.perf_counter() - started, status)
+
+
+async def close() -> None:
+    """Закрывает общие клиенты при остановке бота"""
+    global _redis, _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -0,0 +1,54 @@
+"""Время расчета статистики /stats для теста с большим числом попыток.
+
+Замеряются сборка матрицы ответов из журнала (при промахе кэша), расчет показателей
+и дописывание новой попытки в закэшированную матрицу.
+
+Запуск:
+    python -m benchmarks.bench_analytics
+"""
+import os
+import time
+
+import numpy as np
+
+import analytics
+
+ATTEMPTS = int(os.getenv('BENCH_ATTEMPTS', '1000000'))
+QUESTIONS = int(os.getenv('BENCH_QUESTIONS', '20'))
+OPTIONS = 4
+
+
+def main():
+    rng = np.random.default_rng(1)
+    key = rng.integers(0, OPTIONS, QUESTIONS, dtype=np.uint8)
+    # Сильные участники чаще выбирают правильный вариант, часть попыток прервана
+    ability = rng.random((ATTEMPTS, 1))
+    answers = np.where(rng.random((ATTEMPTS, QUESTIONS)) < ability, key,
+                       rng.integers(0, OPTIONS, (ATTEMPTS, QUESTIONS))).astype(np.uint8)
+    lengths = np.where(rng.random(ATTEMPTS) < 0.05, rng.integers(0, QUESTIONS, ATTEMPTS), QUESTIONS)
+    rows = [row[:length].tobytes() for row, length in zip(answers, lengths)]  # как в журнале попыток
+    questions = [{'text': f'Вопрос {i}', 'answers': [f'Вариант {o}' for o in range(OPTIONS)],
+                  'correct_index': int(key[i])} for i in range(QUESTIONS)]
+
+    started = time.perf_counter()
+    matrix = analytics.AnswerMatrix(QUESTIONS, rows)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    stats = analytics.compute(matrix.array, key, OPTIONS)
+    messages = analytics.report('Тест', questions, stats)
+    compute = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for row in rows[:10000]:
+        matrix.append(row)
+    append = (time.perf_counter() - started) / 10000
+
+    print(f'{ATTEMPTS} попыток x {QUESTIONS} вопросов, матрица {matrix.array.nbytes / 2 ** 20:.0f} МБ')
+    print(f'сборка матрицы из журнала: {build * 1000:.0f} мс')
+    print(f'расчет показателей и отчет ({len(messages)} сообщений): {compute * 1000:.0f} мс')
+    print(f'дописывание попытки: {append * 1e6:.1f} мкс')
+
+
+if __name__ == '__main__':
+    main()
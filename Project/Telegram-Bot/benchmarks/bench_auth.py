@@ -0,0 +1,70 @@
+"""Стоимость проверки прав на одну админ-команду (check_jwt_token) с холодным и теплым кэшем.
+
+Холодный кэш - каждая проверка читает сессию из Redis и заново проверяет подпись JWT,
+теплый - сессия и результат проверки берутся из памяти процесса.
+Работает с Redis из REDIS_URL; если он недоступен и установлен fakeredis - с ним
+(тогда холодный замер не включает сетевую задержку до Redis).
+
+Запуск:
+    python -m benchmarks.bench_auth
+"""
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+import redis.asyncio as aioredis
+
+os.environ.setdefault('TOKEN', '123456:TEST')
+os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret')
+
+import handlers  # noqa: E402
+import token_cache  # noqa: E402
+
+CHECKS = int(os.getenv('BENCH_CHECKS', '20000'))
+USERS = int(os.getenv('BENCH_USERS', '100'))
+
+
+async def connect():
+    client = aioredis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/15'))
+    try:
+        await client.ping()
+        return client, 'redis'
+    except (OSError, aioredis.ConnectionError):
+        import fakeredis
+        return fakeredis.FakeAsyncRedis(), 'fakeredis'
+
+
+def fake_update(chat_id):
+    async def reply_text(text, **kwargs):
+        return None
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), message=SimpleNamespace(reply_text=reply_text))
+
+
+async def measure(sessions, updates):
+    handlers._sessions = sessions
+    started = time.perf_counter()
+    for i in range(CHECKS):
+        await handlers.check_jwt_token(updates[i % len(updates)], None)
+    return (time.perf_counter() - started) / CHECKS
+
+
+async def main_bench():
+    redis, backend = await connect()
+    exp = int(time.time()) + 3600
+    updates = [fake_update(10**9 + i) for i in range(USERS)]
+    for update in updates:
+        token = token_cache.sign_jwt({'email': f'{update.effective_chat.id}@example.com', 'roles': ['admin'],
+                                      'iss': 'auth-service', 'exp': exp})
+        await redis.set(update.effective_chat.id, token, ex=3600)
+
+    cold = await measure(token_cache.SessionCache(redis, local_ttl=0), updates)
+    warm = await measure(token_cache.SessionCache(redis), updates)
+    await redis.delete(*(update.effective_chat.id for update in updates))
+    print(f'{backend}: {USERS} администраторов, {CHECKS} проверок')
+    print(f'холодный кэш (Redis + проверка подписи): {cold * 1e6:.1f} мкс на команду')
+    print(f'теплый кэш (память процесса):            {warm * 1e6:.1f} мкс на команду')
+
+
+if __name__ == '__main__':
+    asyncio.run(main_bench())
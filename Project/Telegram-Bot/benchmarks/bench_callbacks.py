@@ -0,0 +1,52 @@
+"""Стоимость разбора и проверки одного нажатия на вариант ответа: прежний формат против компактного.
+
+Запуск:
+    python -m benchmarks.bench_callbacks
+"""
+import os
+import random
+import timeit
+
+import callbacks
+import storage
+
+CALLS = int(os.getenv('BENCH_CALLS', '200000'))
+QUESTIONS = 50
+OPTIONS = 4
+
+
+def main():
+    random.seed(1)
+    answers = [f'Вариант ответа номер {option} с достаточно длинным текстом' for option in range(OPTIONS)]
+    questions = [{'text': f'Вопрос {i}', 'answers': answers, 'correct_answer': answers[i % OPTIONS],
+                  'correct_index': i % OPTIONS} for i in range(QUESTIONS)]
+
+    # Прежний вариант: текст ответа в callback_data и сравнение строк
+    tasts = {'Тест': {'questions': questions}}
+    old_data = [(f'answer_{random.choice(answers)}', random.randrange(QUESTIONS)) for _ in range(1000)]
+
+    def old_check(data, index):
+        selected_answer = data.replace('answer_', '')
+        return selected_answer == tasts['Тест']['questions'][index]['correct_answer']
+
+    # Новый вариант: компактная кнопка и сравнение номера варианта
+    store = storage.MemoryTestStore()
+    test_id = store.create('Тест', 1)
+    store.add_questions('Тест', questions)
+    new_data = [(callbacks.encode_answer(test_id, index, random.randrange(OPTIONS)), index)
+                for _, index in old_data]
+
+    def new_check(data, index):
+        _, decoded_test, question, option = callbacks.decode(data)
+        return decoded_test == test_id and question == index and \
+            option == store.get_question('Тест', index)['correct_index']
+
+    print(f'Длина callback_data: прежняя {max(len(d.encode()) for d, _ in old_data)} байт '
+          f'(лимит Telegram 64), новая {len(new_data[0][0])} байт')
+    for name, check, data in (('old', old_check, old_data), ('new', new_check, new_data)):
+        seconds = timeit.timeit(lambda: [check(d, i) for d, i in data], number=CALLS // len(data))
+        print(f'{name}: {seconds / CALLS * 1e9:.0f} нс на нажатие')
+
+
+if __name__ == '__main__':
+    main()
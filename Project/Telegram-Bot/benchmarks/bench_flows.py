@@ -0,0 +1,228 @@
+"""Сквозной офлайн-замер сценариев бота: создание теста, прохождение, рейтинг, удаление.
+
+Настоящие обработчики из main.create_application() получают синтетические Update и
+отвечают через Bot API в памяти этого же процесса; рейтинг (и persistence, если
+PERSISTENCE=redis) работает на fakeredis, сети нет. Лимиты отправки подняты, чтобы
+замерялась обработка, а не ожидание ограничителя.
+
+Для каждого масштаба (число пользователей, по USERS_PER_TEST на один тест) печатаются
+пропускная способность одного потока обработки, p50/p99 задержки обновления по этапам
+и память на пользователя с незавершенной попыткой - прирост tracemalloc на
+MEMORY_PROBE дополнительных попыток поверх уже идущих.
+
+Результаты можно сохранить как базовые и сравнивать с ними следующие прогоны:
+при замедлении или росте памяти больше чем на BENCH_TOLERANCE скрипт завершается с кодом 1.
+
+Запуск:
+    python -m benchmarks.bench_flows
+    python -m benchmarks.bench_flows --scales 10,100,1000 --save     # записать базовые результаты
+    python -m benchmarks.bench_flows --scales 10,100,1000 --compare  # сравнить с ними
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import fakeredis
+from telegram import Update
+
+for name in ('SEND_GLOBAL_RATE', 'SEND_GLOBAL_BURST', 'SEND_CHAT_RATE', 'SEND_CHAT_BURST', 'SEND_GROUP_RATE'):
+    os.environ.setdefault(name, '1000000000')
+os.environ.setdefault('LEADERBOARD', 'redis')
+
+import auth_client  # noqa: E402
+import callbacks  # noqa: E402
+import handlers  # noqa: E402
+import main  # noqa: E402
+from benchmarks.stub_bot_api import BOT_USER, FakeBotApi  # noqa: E402
+
+USERS_PER_TEST = int(os.getenv('BENCH_USERS_PER_TEST', '100'))
+MEMORY_PROBE = int(os.getenv('BENCH_MEMORY_PROBE', '1000'))
+TOLERANCE = float(os.getenv('BENCH_TOLERANCE', '0.2'))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_flows.json')
+CREATOR_IDS = 10 ** 9  # создатели тестов - отдельный диапазон id от проходящих
+
+
+class Updates:
+    """Синтетические обновления от пользователей"""
+
+    def __init__(self, bot):
+        self._bot = bot
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+
+    def message(self, user_id: int, text: str) -> Update:
+        message = {'message_id': next(self._ids), 'date': int(time.time()), 'text': text,
+                   'chat': {'id': user_id, 'type': 'private'}, 'from': self._user(user_id)}
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return Update.de_json({'update_id': next(self._ids), 'message': message}, self._bot)
+
+    def callback(self, user_id: int, data: str) -> Update:
+        message = {'message_id': next(self._ids), 'date': int(time.time()), 'text': '...',
+                   'chat': {'id': user_id, 'type': 'private'}, 'from': BOT_USER}
+        return Update.de_json({'update_id': next(self._ids), 'callback_query': {
+            'id': str(next(self._ids)), 'chat_instance': str(user_id), 'data': data,
+            'from': self._user(user_id), 'message': message}}, self._bot)
+
+
+async def run_phase(application, updates) -> list:
+    """Обрабатывает обновления по одному; возвращает время обработки каждого, с"""
+    latencies = []
+    for update in updates:  # обновление собирается до начала замера
+        started = time.perf_counter()
+        await application.process_update(update)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def summary(latencies: list) -> dict:
+    latencies = sorted(latencies)
+    return {'updates': len(latencies), 'throughput': len(latencies) / sum(latencies),
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p99_ms': latencies[math.ceil(len(latencies) * 0.99) - 1] * 1000}
+
+
+def create_updates(updates, creators: int, questions: int):
+    """/create и диалог создания теста из questions вопросов с 4 вариантами"""
+    for creator in range(CREATOR_IDS, CREATOR_IDS + creators):
+        yield updates.message(creator, '/create')
+        yield updates.message(creator, f'Тест {creator}')
+        yield updates.message(creator, '30')
+        for index in range(questions):
+            yield updates.message(creator, f'Вопрос {index} теста {creator}?')
+            yield updates.message(creator, 'первый, второй, третий, четвертый')
+            yield updates.callback(creator, f'correct_{index % 4}')
+            yield updates.callback(creator, 'add_question' if index + 1 < questions else 'finish_creation')
+
+
+def start_updates(updates, users, test_ids: list):
+    """/tests и выбор теста - попытка начата и ждет ответов"""
+    for user in users:
+        yield updates.message(user, '/tests')
+        yield updates.callback(user, callbacks.encode_test(test_ids[user % len(test_ids)]))
+
+
+def answer_updates(updates, users: int, test_ids: list, questions: int, rng):
+    """Ответы всех пользователей по кругу: вопрос 1 у всех, затем вопрос 2 и т. д."""
+    for index in range(questions):
+        for user in range(users):
+            # Правильный вариант вопроса index - index % 4, угадывается в 70% случаев
+            option = index % 4 if rng.random() < 0.7 else (index + 1) % 4
+            yield updates.callback(user, callbacks.encode_answer(test_ids[user % len(test_ids)], index, option))
+
+
+async def bench_scale(users: int, questions: int) -> dict:
+    auth_client._redis = fakeredis.FakeAsyncRedis()  # рейтинг и persistence без настоящего Redis
+    api = FakeBotApi()
+    application = main.create_application('123456:TEST', request=api)
+    await application.initialize()
+    await application.start()
+    updates = Updates(application.bot)
+    rng = random.Random(users)
+    creators = max(1, users // USERS_PER_TEST)
+    phases = {}
+    try:
+        phases['create'] = await run_phase(application, create_updates(updates, creators, questions))
+        test_ids = [handlers.test_store.get_id(f'Тест {creator}')
+                    for creator in range(CREATOR_IDS, CREATOR_IDS + creators)]
+        phases['tests'] = await run_phase(application, start_updates(updates, range(users), test_ids))
+
+        # Память: попытки еще MEMORY_PROBE пользователей поверх users уже начатых
+        probe = range(users, users + min(users, MEMORY_PROBE))
+        tracemalloc.start()
+        await run_phase(application, start_updates(updates, probe, test_ids))
+        memory = tracemalloc.get_traced_memory()[0] / len(probe)
+        tracemalloc.stop()
+
+        phases['check_answer'] = await run_phase(application, answer_updates(updates, users, test_ids, questions, rng))
+        if await handlers.rankings.count() != users:
+            # Обработчики ответили не так, как ожидает сценарий, - замер был бы не о том
+            raise RuntimeError(f'Завершено попыток: {await handlers.rankings.count()} из {users}')
+        phases['list_rankings'] = await run_phase(
+            application, (updates.message(user, '/list_rankings') for user in range(users)))
+        phases['delete_test'] = await run_phase(application, itertools.chain.from_iterable(
+            (updates.message(creator, '/delete'), updates.message(creator, f'Тест {creator}'))
+            for creator in range(CREATOR_IDS, CREATOR_IDS + creators)))
+        total = sum(len(latencies) for latencies in phases.values())
+        return {'phases': {name: summary(latencies) for name, latencies in phases.items()},
+                'memory_per_user_bytes': memory, 'api_calls_per_update': api.calls / total}
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await handlers.deadlines.stop()
+        await auth_client.close()
+
+
+def print_scale(users: int, result: dict, baseline: dict = None) -> list:
+    """Печатает результаты масштаба и возвращает список регрессий относительно baseline"""
+    regressions = []
+    print(f'\nпользователей: {users}, API-вызовов на обновление: {result["api_calls_per_update"]:.2f}')
+    print(f'{"этап":<14} {"обновлений":>10} {"обн/с":>8} {"p50, мс":>9} {"p99, мс":>9}'
+          + ('   к базовым (p50, обн/с)' if baseline else ''))
+    for name, phase in result['phases'].items():
+        line = (f'{name:<14} {phase["updates"]:>10} {phase["throughput"]:>8.0f} '
+                f'{phase["p50_ms"]:>9.2f} {phase["p99_ms"]:>9.2f}')
+        base = baseline and baseline['phases'].get(name)
+        if base:
+            slower = phase['p50_ms'] / base['p50_ms']
+            fewer = base['throughput'] / phase['throughput']
+            line += f'   x{slower:.2f}, x{1 / fewer:.2f}'
+            if max(slower, fewer) > 1 + TOLERANCE:
+                line += '  <- регрессия'
+                regressions.append(f'{users}/{name}')
+        print(line)
+    memory = result['memory_per_user_bytes']
+    line = f'память на пользователя с активной попыткой: {memory / 1024:.2f} КБ'
+    if baseline:
+        line += f' (базовые {baseline["memory_per_user_bytes"] / 1024:.2f} КБ)'
+        if memory > baseline['memory_per_user_bytes'] * (1 + TOLERANCE):
+            line += '  <- регрессия'
+            regressions.append(f'{users}/memory')
+    print(line)
+    return regressions
+
+
+async def run(args):
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['scales']
+    results = {}
+    regressions = []
+    for users in args.scales:
+        results[str(users)] = await bench_scale(users, args.questions)
+        regressions += print_scale(users, results[str(users)], baseline and baseline.get(str(users)))
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'platform': platform.platform(),
+                       'questions': args.questions, 'users_per_test': USERS_PER_TEST, 'scales': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f'\nрезультаты сохранены в {args.save}')
+    if regressions:
+        print(f'\nрегрессии больше {TOLERANCE:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scales', type=lambda value: [int(s) for s in value.split(',')],
+                        default=[10, 100, 1000, 10000, 100000], help='числа пользователей через запятую')
+    parser.add_argument('--questions', type=int, default=5, help='вопросов в тесте')
+    parser.add_argument('--save', nargs='?', const=BASELINE, help='сохранить результаты как базовые')
+    parser.add_argument('--compare', nargs='?', const=BASELINE, help='сравнить с базовыми результатами')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main_cli()
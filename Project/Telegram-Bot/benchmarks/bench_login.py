@@ -0,0 +1,131 @@
+"""Нагрузочный тест авторизации: 500 одновременных /login при медленном сервере авторизации.
+
+Пока логины ждут ответа заглушки, обычные обновления (/start) из других чатов приходят
+равномерным потоком (BENCH_OTHER_RATE в секунду, меньше пропускной способности одного
+обработчика, чтобы замерялась блокировка, а не очередь) и проходят через application.process_update, как из вебхука. Задержка
+каждого считается от запланированного момента прихода, поэтому время, когда цикл
+событий был занят, в нее попадает. Отдельно каждую миллисекунду замеряется, насколько
+позже срока просыпается цикл событий. Обе величины не должны зависеть от медленного сервера.
+
+Логины вызывают login_with_type напрямую: команду /login в приложении первым
+принимает обработчик login, который к серверу авторизации не обращается.
+
+Запуск (нужен локальный Redis, адрес берётся из REDIS_URL; BENCH_FAKEREDIS=1 - без него):
+    python -m benchmarks.bench_login
+"""
+import asyncio
+import itertools
+import os
+import statistics
+import time
+
+from aiohttp import web
+from telegram import Update
+
+os.environ.setdefault('TOKEN', '123456:TEST')
+# Ограничитель отправки не должен растягивать ответы - замеряется обработка
+for name in ('SEND_GLOBAL_RATE', 'SEND_GLOBAL_BURST', 'SEND_CHAT_RATE', 'SEND_CHAT_BURST', 'SEND_GROUP_RATE'):
+    os.environ.setdefault(name, '1000000000')
+
+import auth_client  # noqa: E402
+import handlers  # noqa: E402
+import main  # noqa: E402
+from benchmarks.stub_bot_api import FakeBotApi  # noqa: E402
+
+LOGINS = int(os.getenv('BENCH_LOGINS', '500'))
+OTHER_UPDATES = int(os.getenv('BENCH_OTHER_UPDATES', '1000'))
+OTHER_RATE = float(os.getenv('BENCH_OTHER_RATE', '500'))  # обычных обновлений в секунду
+AUTH_DELAY = float(os.getenv('BENCH_AUTH_DELAY', '0.5'))
+LAG_INTERVAL = 0.001  # шаг проверки задержки цикла событий, с
+
+_ids = itertools.count(1)
+
+
+def command(bot, chat_id: int, text: str) -> Update:
+    message = {'message_id': next(_ids), 'date': int(time.time()), 'text': text,
+               'chat': {'id': chat_id, 'type': 'private'},
+               'from': {'id': chat_id, 'is_bot': False, 'first_name': 'user'},
+               'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]}
+    return Update.de_json({'update_id': next(_ids), 'message': message}, bot)
+
+
+async def start_stub_server():
+    """Заглушка сервера авторизации, отвечающая с задержкой"""
+    async def handler(request):
+        await asyncio.sleep(AUTH_DELAY)
+        return web.json_response({'role': 'user'})
+
+    app = web.Application()
+    app.router.add_post('/', handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/'
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def timed(coro, arrival: float, latencies: list):
+    """Выполняет coro и записывает время от arrival (момента прихода обновления) до конца"""
+    await coro
+    latencies.append(time.perf_counter() - arrival)
+
+
+async def other_updates(application, start: float, latencies: list):
+    """/start из разных чатов равномерно, OTHER_RATE в секунду"""
+    step = 1 / OTHER_RATE
+    tasks = []
+    for i in range(OTHER_UPDATES):
+        arrival = start + i * step
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        update = command(application.bot, LOGINS + i, '/start')
+        tasks.append(asyncio.create_task(timed(application.process_update(update), arrival, latencies)))
+    await asyncio.gather(*tasks)
+
+
+async def loop_lag(stop: asyncio.Event, lags: list):
+    """Насколько позже запрошенного просыпается цикл событий"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(time.perf_counter() - started - LAG_INTERVAL)
+
+
+async def run():
+    if os.getenv('BENCH_FAKEREDIS') == '1':
+        import fakeredis
+        auth_client._redis = fakeredis.FakeAsyncRedis(max_connections=LOGINS + OTHER_UPDATES)
+    runner, handlers.SERVER_URL = await start_stub_server()
+    application = main.create_application(request=FakeBotApi())
+    await application.initialize()
+    login_latencies, other_latencies, lags = [], [], []
+    stop = asyncio.Event()
+    try:
+        probe = asyncio.create_task(loop_lag(stop, lags))
+        started = time.perf_counter()  # все логины приходят в этот момент
+        logins = [timed(handlers.login_with_type(command(application.bot, i, '/login type=code'), None),
+                        started, login_latencies) for i in range(LOGINS)]
+        await asyncio.gather(*logins, other_updates(application, started, other_latencies))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+    finally:
+        await application.shutdown()
+        await auth_client.close()
+        await runner.cleanup()
+
+    print(f'logins: {LOGINS}, other updates: {OTHER_UPDATES} ({OTHER_RATE:.0f}/s), auth delay: {AUTH_DELAY * 1000:.0f} ms, total: {elapsed:.2f} s')
+    for name, samples in (('login', login_latencies), ('other', other_latencies), ('loop lag', lags)):
+        if not samples:
+            continue
+        print(f'{name:>8}: p50 {statistics.median(samples) * 1000:.1f} ms, '
+              f'p99 {percentile(samples, 0.99) * 1000:.1f} ms, max {max(samples) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    asyncio.run(run())
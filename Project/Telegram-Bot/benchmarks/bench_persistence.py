@@ -0,0 +1,84 @@
+"""Накладные расходы persistence на одно обновление: полный дамп на каждое обновление против
+пакетной записи изменившихся пользователей раз в интервал.
+
+Работает с Redis из REDIS_URL; если он недоступен и установлен fakeredis - с ним.
+
+Запуск:
+    python -m benchmarks.bench_persistence
+"""
+import asyncio
+import os
+import pickle
+import random
+import time
+from copy import deepcopy
+
+import redis.asyncio as aioredis
+
+from persistence import RedisPersistence
+
+USERS = int(os.getenv('BENCH_USERS', '10000'))
+UPDATES = int(os.getenv('BENCH_UPDATES', '20000'))
+# Сколько обновлений приходит за один интервал записи
+UPDATES_PER_FLUSH = int(os.getenv('BENCH_UPDATES_PER_FLUSH', '500'))
+
+
+async def connect():
+    client = aioredis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/15'))
+    try:
+        await client.ping()
+        return client, 'redis'
+    except (OSError, aioredis.ConnectionError):
+        import fakeredis
+        return fakeredis.FakeAsyncRedis(), 'fakeredis'
+
+
+def handle(user_data, user_id):
+    """Имитация обработчика: ответ на вопрос меняет пару полей попытки"""
+    data = user_data.setdefault(user_id, {'current_test': 'Тест', 'current_question_index': 0,
+                                          'correct_answers': 0})
+    data['current_question_index'] += 1
+    data['correct_answers'] += random.random() < 0.5
+
+
+async def full_dump(redis, user_ids):
+    user_data = {}
+    started = time.perf_counter()
+    for user_id in user_ids:
+        handle(user_data, user_id)
+        await redis.set('bench:dump', pickle.dumps(user_data))
+    return time.perf_counter() - started
+
+
+async def batched(redis, user_ids):
+    persistence = RedisPersistence(redis, prefix='bench')
+    user_data, dirty = {}, set()
+    started = time.perf_counter()
+    for i, user_id in enumerate(user_ids, 1):
+        handle(user_data, user_id)
+        dirty.add(user_id)
+        if i % UPDATES_PER_FLUSH == 0 or i == len(user_ids):
+            # То же, что делает Application.update_persistence
+            for changed in dirty:
+                await persistence.update_user_data(changed, deepcopy(user_data[changed]))
+            dirty.clear()
+            await persistence.flush()
+    return time.perf_counter() - started
+
+
+async def main():
+    random.seed(1)
+    redis, backend = await connect()
+    user_ids = [random.randrange(USERS) for _ in range(UPDATES)]
+    # Полный дамп растет вместе с числом пользователей, поэтому меряем на меньшей выборке
+    dump_updates = user_ids[:min(len(user_ids), 2000)]
+    dump = await full_dump(redis, dump_updates) / len(dump_updates)
+    batch = await batched(redis, user_ids) / len(user_ids)
+    await redis.delete('bench:dump', 'bench:user_data')
+    print(f'{backend}: {USERS} пользователей, запись раз в {UPDATES_PER_FLUSH} обновлений')
+    print(f'полный дамп на обновление: {dump * 1e6:.0f} мкс на обновление')
+    print(f'пакетная запись:          {batch * 1e6:.0f} мкс на обновление')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""Задержка /list_rankings от 1k до 1M пользователей: прежний пересчет против инкрементального рейтинга.
+
+Запуск:
+    python -m benchmarks.bench_rankings
+"""
+import asyncio
+import os
+import random
+import time
+
+from leaderboard import Leaderboard
+
+SIZES = [int(size) for size in os.getenv('BENCH_SIZES', '1000,10000,100000,1000000').split(',')]
+TESTS_PER_USER = 5
+PAGE = 10
+REPEAT = 200
+# Прежний пересчет на миллионе пользователей занимает секунды - ограничиваем его
+OLD_MAX_USERS = int(os.getenv('BENCH_OLD_MAX_USERS', '100000'))
+
+
+def old_list_rankings(scores):
+    """Прежний вариант: сумма по всем тестам и полная сортировка на каждый запрос"""
+    user_scores = {user: sum(test_scores.values()) for user, test_scores in scores.items()}
+    sorted_scores = sorted(user_scores.items(), key=lambda item: item[1], reverse=True)
+    return '\n'.join([f'{user_name}: {score} баллов' for user_name, score in sorted_scores])
+
+
+async def new_list_rankings(board, user_id):
+    entries = await board.page(random.randrange(await board.count()), PAGE)
+    own = await board.rank(user_id)
+    return entries, own
+
+
+async def bench(users):
+    scores = {}
+    board = Leaderboard()
+    for user_id in range(users):
+        tests = {f't{i}': random.randrange(20) for i in range(TESTS_PER_USER)}
+        scores[user_id] = tests
+        await board.add(user_id, f'user{user_id}', sum(tests.values()))
+
+    old = None
+    if users <= OLD_MAX_USERS:
+        repeat = max(1, REPEAT * 1000 // users)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            old_list_rankings(scores)
+        old = (time.perf_counter() - started) / repeat * 1000
+
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        await new_list_rankings(board, random.randrange(users))
+    new = (time.perf_counter() - started) / REPEAT * 1000
+    return old, new
+
+
+async def main():
+    random.seed(1)
+    print(f'{"users":>10} {"old, ms":>10} {"new, ms":>10}')
+    for users in SIZES:
+        old, new = await bench(users)
+        old = f'{old:.3f}' if old is not None else '-'
+        print(f'{users:>10} {old:>10} {new:>10.3f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Поиск /search по каталогу из 100k тестов: индекс против перебора всех тестов.
+
+Замеряются построение индекса и его размер в памяти, задержка запросов разных видов
+(слово из названия, часть слова, опечатка, слово из вопросов, частое слово),
+а также добавление и удаление теста. Для сравнения - перебор всех названий и
+текстов вопросов с поиском подстроки, как сделал бы /list без индекса.
+
+Запуск:
+    python -m benchmarks.bench_search
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+import search
+
+TESTS = int(os.getenv('BENCH_TESTS', '100000'))
+QUESTIONS = int(os.getenv('BENCH_QUESTIONS', '5'))
+QUERIES = int(os.getenv('BENCH_QUERIES', '200'))
+
+SYLLABLES = [consonant + vowel for consonant in 'бвгдзклмнпрстфхцчш' for vowel in 'аеиоуя']
+
+
+def make_catalog(rng):
+    vocabulary = sorted({''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(20000)})
+    documents = []
+    for test_id in range(1, TESTS + 1):
+        name = ' '.join(rng.choices(vocabulary, k=rng.randint(2, 4))) + f' {test_id}'
+        texts = [' '.join(rng.choices(vocabulary, k=8)) + '?' for _ in range(QUESTIONS)]
+        documents.append((test_id, name, texts))
+    return vocabulary, documents
+
+
+def queries(rng, documents):
+    """Запросы каждого вида по QUERIES штук"""
+    samples = rng.sample(documents, QUERIES)
+    typo = lambda word: word[:len(word) // 2] + word[len(word) // 2 + 1:]  # пропущена буква
+    return {
+        'слово названия': [name.split()[0] for _, name, _ in samples],
+        'часть слова': [name.split()[0][:5] for _, name, _ in samples],
+        'опечатка': [typo(name.split()[0]) for _, name, _ in samples],
+        'слово вопроса': [texts[0].split()[0] for _, _, texts in samples],
+        'два слова': [' '.join(name.split()[:2]) for _, name, _ in samples],
+    }
+
+
+def latencies(func, items):
+    result = []
+    for item in items:
+        started = time.perf_counter()
+        func(item)
+        result.append((time.perf_counter() - started) * 1000)
+    result.sort()
+    return statistics.median(result), result[int(len(result) * 0.99) - 1]
+
+
+def scan(documents, query):
+    """Прежний вариант: перебор всех тестов с поиском подстроки"""
+    query = query.lower()
+    return [(test_id, name) for test_id, name, texts in documents
+            if query in name.lower() or any(query in text.lower() for text in texts)][:10]
+
+
+def index_size(index) -> int:
+    """Размер словарей и массивов индекса в байтах (названия тестов не считаются - они есть и в хранилище)"""
+    size = sys.getsizeof(index._names) + sys.getsizeof(index._sizes)
+    for postings in (index._grams, index._words):
+        size += sys.getsizeof(postings) + sum(sys.getsizeof(key) + sys.getsizeof(ids) for key, ids in postings.items())
+    return size
+
+
+def main():
+    rng = random.Random(1)
+    vocabulary, documents = make_catalog(rng)
+
+    started = time.perf_counter()
+    index = search.SearchIndex(documents)
+    build = time.perf_counter() - started
+    memory = index_size(index)
+    print(f'{TESTS} тестов по {QUESTIONS} вопросов: индекс строится за {build:.1f} с, '
+          f'занимает {memory / 2 ** 20:.0f} МБ')
+
+    print(f'{"запрос":<16} {"найдено":>8} {"индекс p50/p99, мс":>20} {"перебор p50, мс":>16}')
+    for kind, items in queries(rng, documents).items():
+        found = statistics.median(index.search(query)[0] for query in items)
+        p50, p99 = latencies(index.search, items)
+        scan_p50, _ = latencies(lambda query: scan(documents, query), items[:5])
+        print(f'{kind:<16} {found:>8.0f} {p50:>10.2f} / {p99:<8.2f} {scan_p50:>16.0f}')
+
+    new = [(TESTS + i, ' '.join(rng.choices(vocabulary, k=3)), [' '.join(rng.choices(vocabulary, k=8))])
+           for i in range(1, 10001)]
+    started = time.perf_counter()
+    for test_id, name, texts in new:
+        index.add(test_id, name, texts)
+    add = (time.perf_counter() - started) / len(new)
+    started = time.perf_counter()
+    for test_id, _, _ in new:
+        index.remove(test_id)
+    remove = (time.perf_counter() - started) / len(new)
+    print(f'добавление теста: {add * 1e6:.0f} мкс, удаление: {remove * 1e6:.1f} мкс '
+          '(с учетом периодической очистки индекса)')
+
+
+if __name__ == '__main__':
+    main()
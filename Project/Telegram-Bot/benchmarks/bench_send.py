@@ -0,0 +1,66 @@
+"""Отправка сообщений под нагрузкой против заглушки Bot API с лимитами Telegram.
+
+Каждый из BENCH_CHATS чатов одновременно получает BENCH_MESSAGES простых сообщений
+и одно с клавиатурой (как ответы нескольких обработчиков и уведомления планировщика).
+Без rate limiter часть запросов получает 429 и теряется; с ChatRateLimiter все
+сообщения доходят, а ожидающие очереди простые сообщения склеиваются.
+
+Запуск:
+    python -m benchmarks.bench_send
+"""
+import asyncio
+import os
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from benchmarks.stub_bot_api import StubBotApi
+from ratelimit import ChatRateLimiter
+
+CHATS = int(os.getenv('BENCH_CHATS', '100'))
+MESSAGES = int(os.getenv('BENCH_MESSAGES', '3'))
+# Лимиты заглушки: 30 сообщений в секунду на бота, 1 в секунду на чат с запасом 3
+FLOOD_LIMITS = (30, 30, 1, 3)
+MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton('Ответ', callback_data='x')]])
+
+
+async def run(rate_limiter):
+    stub = StubBotApi(flood_limits=FLOOD_LIMITS)
+    url = await stub.start()
+    bot = ExtBot('1:BENCH', base_url=f'{url}/bot', rate_limiter=rate_limiter,
+                 request=HTTPXRequest(connection_pool_size=256))
+    await bot.initialize()
+
+    async def send(chat_id, i):
+        if i < MESSAGES:
+            await bot.send_message(chat_id, f'Сообщение {i}')
+        else:
+            await bot.send_message(chat_id, 'Вопрос', reply_markup=MARKUP)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[send(100000 + chat, i) for chat in range(CHATS) for i in range(MESSAGES + 1)],
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    await bot.shutdown()
+    await stub.stop()
+    dropped = sum(isinstance(result, TelegramError) for result in results)
+    return {'elapsed': elapsed, 'delivered': len(results) - dropped, 'dropped': dropped,
+            'requests': stub.calls.get('sendMessage', 0), 'flooded': stub.flooded,
+            'merged': getattr(rate_limiter, 'merged', 0)}
+
+
+async def main():
+    total = CHATS * (MESSAGES + 1)
+    print(f'{CHATS} чатов, {total} сообщений, лимиты заглушки {FLOOD_LIMITS}')
+    for name, rate_limiter in (('без ограничения', None), ('ChatRateLimiter', ChatRateLimiter())):
+        r = await run(rate_limiter)
+        print(f'{name}: доставлено {r["delivered"]}/{total} за {r["elapsed"]:.1f} с '
+              f'({r["delivered"] / r["elapsed"]:.0f} сообщений/с), потеряно {r["dropped"] / total:.1%}, '
+              f'запросов sendMessage {r["requests"]}, ответов 429 {r["flooded"]}, склеено {r["merged"]}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""Холодный старт реплики бота: импорт модулей и сборка приложения до запуска сервера.
+
+Каждый замер - отдельный процесс python, как при запуске новой реплики:
+  - import main - точка входа не должна ничего загружать и создавать;
+  - готовность - create_application() и приложение вебхука, все без сетевых запросов.
+Затем один запуск с python -X importtime показывает, какие пакеты дороже всего.
+Скрипт завершается с кодом 1, если медиана готовности больше STARTUP_TARGET_MS или
+если к готовности загружен пакет, который должен импортироваться лениво (LAZY_PACKAGES).
+
+Запуск:
+    python -m benchmarks.bench_startup
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = int(os.getenv('BENCH_RUNS', '10'))
+# Цель для горизонтального масштабирования: новая реплика готова принимать вебхук за это время.
+# Медиана готовности на машине разработки - 650-900 мс в зависимости от ее загрузки, почти все
+# это импорт aiohttp, telegram и httpx/httpcore, без которых реплика не работает. Цель взята
+# с запасом около 30% над худшей медианой, чтобы замер не падал от шума; регрессии меньше
+# этого запаса ловит проверка LAZY_PACKAGES, которая от скорости машины не зависит.
+STARTUP_TARGET_MS = float(os.getenv('STARTUP_TARGET_MS', '1200'))
+# Пакеты, которые нужны не каждой реплике и грузятся при первом использовании:
+# NumPy - с первым /stats, redis - с первым клиентом (PERSISTENCE/LEADERBOARD=redis)
+LAZY_PACKAGES = ('numpy', 'redis')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = {
+    'интерпретатор': 'pass',
+    'import main': 'import main',
+    'готовность': 'import main, webhook; webhook.create_webhook_app(main.create_application())',
+}
+
+
+def run(code: str, *flags, defaults: tuple = ()) -> subprocess.CompletedProcess:
+    """Запускает code в новом процессе; настройки из defaults берутся по умолчанию, а не из окружения"""
+    env = {name: value for name, value in os.environ.items() if name not in defaults}
+    env['TOKEN'] = os.getenv('TOKEN', '123456:TEST')
+    return subprocess.run([sys.executable, *flags, '-c', code], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def wall_ms(code: str) -> float:
+    """Медиана времени процесса от запуска до выхода, мс"""
+    times = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        run(code)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def loaded_lazy_packages() -> list:
+    """Какие из LAZY_PACKAGES загружены к готовности при настройках по умолчанию"""
+    code = (SCRIPTS['готовность'] + '; import sys; '
+            f'print(" ".join(name for name in {LAZY_PACKAGES!r} if name in sys.modules))')
+    return run(code, defaults=('PERSISTENCE', 'LEADERBOARD')).stdout.split()
+
+
+def top_imports(code: str, limit: int = 10) -> list:
+    """Пакеты по суммарному времени импорта (вместе с вложенными) из python -X importtime, мс"""
+    packages = {}
+    for line in run(code, '-X', 'importtime').stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        if '.' not in name:  # только пакеты целиком, их подмодули уже учтены
+            packages[name] = max(packages.get(name, 0), int(parts[1]) / 1000)
+    return sorted(((ms, name) for name, ms in packages.items()), reverse=True)[:limit]
+
+
+def main():
+    results = {name: wall_ms(code) for name, code in SCRIPTS.items()}
+    print(f'медиана по {RUNS} запускам:')
+    for name, ms in results.items():
+        print(f'  {name:<14} {ms:7.0f} мс')
+    print('самые дорогие импорты при готовности (вместе с вложенными):')
+    for ms, name in top_imports(SCRIPTS['готовность']):
+        print(f'  {name:<24} {ms:7.1f} мс')
+    lazy = loaded_lazy_packages()
+    print(f'загружены при старте, хотя должны лениво: {", ".join(lazy) if lazy else "нет"}')
+    ready = results['готовность']
+    print(f'цель {STARTUP_TARGET_MS:.0f} мс: {"выполнена" if ready <= STARTUP_TARGET_MS else "не выполнена"}')
+    if ready > STARTUP_TARGET_MS or lazy:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
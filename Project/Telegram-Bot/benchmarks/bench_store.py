@@ -0,0 +1,73 @@
+"""Сравнение хранилищ тестов с прежним перебором словаря на 100k тестов.
+
+Запуск:
+    python -m benchmarks.bench_store
+"""
+import os
+import random
+import tempfile
+import time
+
+import storage
+
+TESTS = int(os.getenv('BENCH_TESTS', '100000'))
+CREATORS = int(os.getenv('BENCH_CREATORS', '10000'))
+OPS = int(os.getenv('BENCH_OPS', '1000'))
+
+QUESTION = {'text': 'Вопрос', 'answers': ['a', 'b', 'c'], 'correct_answer': 'b', 'correct_index': 1}
+
+
+def per_op(func, args):
+    """Среднее время одной операции в микросекундах"""
+    started = time.perf_counter()
+    for arg in args:
+        func(arg)
+    return (time.perf_counter() - started) / len(args) * 1e6
+
+
+def bench_dict(names, creators):
+    """Прежний вариант: модульный словарь tasts и перебор всех тестов"""
+    tasts = {name: {'questions': [QUESTION], 'time_limit': None, 'creator': creator}
+             for name, creator in zip(names, creators)}
+
+    def delete(name):
+        creator = creators[int(name[1:])]
+        if name in tasts and tasts[name]['creator'] == creator:
+            del tasts[name]
+
+    return {
+        'lookup': per_op(lambda name: tasts[name]['questions'][0], random.sample(names, OPS)),
+        'list': per_op(lambda uid: [t for t, d in tasts.items() if d['creator'] == uid], random.sample(creators, OPS)),
+        'delete': per_op(delete, random.sample(names, OPS)),
+    }
+
+
+def bench_store(store, names, creators):
+    for name, creator in zip(names, creators):
+        store.create(name, creator)
+        store.add_questions(name, [QUESTION])
+    return {
+        'lookup': per_op(lambda name: store.get_question(name, 0), random.sample(names, OPS)),
+        'list': per_op(store.by_creator, random.sample(creators, OPS)),
+        'delete': per_op(lambda name: store.delete(name, creators[int(name[1:])]), random.sample(names, OPS)),
+    }
+
+
+def main():
+    random.seed(1)
+    names = [f't{i}' for i in range(TESTS)]
+    creators = [random.randrange(CREATORS) for _ in range(TESTS)]
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            'dict scan': bench_dict(names, creators),
+            'memory': bench_store(storage.MemoryTestStore(), names, creators),
+            'sqlite': bench_store(storage.SQLiteTestStore(os.path.join(tmp, 'tests.db')), names, creators),
+        }
+    print(f'{TESTS} тестов, {CREATORS} создателей, мкс на операцию')
+    print(f'{"":>10} {"lookup":>10} {"list":>10} {"delete":>10}')
+    for backend, timings in results.items():
+        print(f'{backend:>10} {timings["lookup"]:>10.1f} {timings["list"]:>10.1f} {timings["delete"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Воспроизведение записанных обновлений на вебхук бота с заданной частотой.
+
+Отправляет Update JSON (по одному на строку файла) на вебхук и измеряет время ответа вебхука,
+а если бот направлен на заглушку Bot API этого же скрипта - и полную задержку до ответа бота.
+Без файла отправляются синтетические /start из разных чатов.
+
+Пример:
+    # терминал 1: заглушка Bot API и замер
+    python -m benchmarks.replay_updates --stub-port 8081 --wait
+    # терминал 2: бот, направленный на заглушку
+    TOKEN=123:TEST BOT_API_URL=http://127.0.0.1:8081 WEBHOOK_URL=http://127.0.0.1:8080 python main.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict, deque
+
+import aiohttp
+
+from benchmarks.stub_bot_api import StubBotApi
+
+
+def synthetic_updates(count):
+    now = int(time.time())
+    for i in range(count):
+        chat = {'id': 100000 + i, 'type': 'private'}
+        yield {'update_id': i + 1, 'message': {
+            'message_id': i + 1, 'date': now, 'chat': chat, 'text': '/start',
+            'from': {'id': chat['id'], 'is_bot': False, 'first_name': f'user{i}'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]}}
+
+
+def recorded_updates(path, count):
+    with open(path, encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            if i >= count:
+                break
+            if line.strip():
+                yield json.loads(line)
+
+
+def chat_id(update):
+    for key in ('message', 'edited_message', 'callback_query'):
+        if key in update:
+            body = update[key]
+            body = body.get('message', body) if key == 'callback_query' else body
+            return body.get('chat', {}).get('id')
+    return None
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def replay(args):
+    sent_at = defaultdict(deque)  # chat id -> время отправки обновлений, ждущих ответа бота
+    e2e = []
+
+    def on_message(chat, text):
+        if sent_at[chat]:
+            e2e.append(time.perf_counter() - sent_at[chat].popleft())
+
+    stub = None
+    if args.stub_port is not None:
+        stub = StubBotApi(on_message)
+        print(f'Заглушка Bot API: {await stub.start(port=args.stub_port)}')
+        if args.wait:
+            # input в отдельном потоке, чтобы заглушка отвечала боту, пока мы ждем
+            await asyncio.get_running_loop().run_in_executor(None, input, 'Запустите бота и нажмите Enter...')
+
+    updates = list(recorded_updates(args.file, args.count) if args.file else synthetic_updates(args.count))
+    acks, statuses = [], defaultdict(int)
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def post(session, update):
+        async with limit:
+            chat = chat_id(update)
+            started = time.perf_counter()
+            if chat is not None:
+                sent_at[chat].append(started)
+            try:
+                async with session.post(args.url, json=update) as response:
+                    statuses[response.status] += 1
+            except aiohttp.ClientError:
+                statuses['error'] += 1
+            acks.append(time.perf_counter() - started)
+
+    async with aiohttp.ClientSession() as session:
+        started = time.perf_counter()
+        tasks = []
+        for i, update in enumerate(updates):
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(post(session, update)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    if stub is not None:
+        await asyncio.sleep(args.drain)  # даем боту доработать очередь
+        await stub.stop()
+
+    print(f'Отправлено {len(updates)} обновлений за {elapsed:.2f} с ({len(updates) / elapsed:.0f}/с), '
+          f'ответы вебхука: {dict(statuses)}')
+    print(f'Ответ вебхука: p50 {percentile(acks, 0.5) * 1000:.1f} мс, p99 {percentile(acks, 0.99) * 1000:.1f} мс')
+    if e2e:
+        print(f'До ответа бота ({len(e2e)}): p50 {percentile(e2e, 0.5) * 1000:.1f} мс, '
+              f'p99 {percentile(e2e, 0.99) * 1000:.1f} мс')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=f'http://127.0.0.1:8080/{os.getenv("TOKEN", "123:TEST")}',
+                        help='адрес вебхука бота')
+    parser.add_argument('--file', help='файл с Update JSON, по одному на строку')
+    parser.add_argument('--count', type=int, default=1000, help='сколько обновлений отправить')
+    parser.add_argument('--rate', type=float, default=200, help='обновлений в секунду')
+    parser.add_argument('--concurrency', type=int, default=100, help='одновременных запросов к вебхуку')
+    parser.add_argument('--stub-port', type=int, help='запустить заглушку Bot API на этом порту')
+    parser.add_argument('--wait', action='store_true', help='ждать Enter после запуска заглушки')
+    parser.add_argument('--drain', type=float, default=2.0, help='сколько секунд ждать ответов бота в конце')
+    asyncio.run(replay(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
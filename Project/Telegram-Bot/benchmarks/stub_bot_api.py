@@ -0,0 +1,142 @@
+"""Заглушка Telegram Bot API для локальных замеров.
+
+Отвечает на любые методы бота правдоподобными данными и считает отправленные сообщения.
+Бот направляется на заглушку переменной окружения BOT_API_URL, например http://127.0.0.1:8081
+С flood_limits заглушка, как и Telegram, отвечает 429 с retry_after на слишком частые отправки.
+FakeBotApi - то же без HTTP: передается в main.create_application(request=...).
+"""
+import itertools
+import json
+import math
+import time
+
+from aiohttp import web
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'}
+
+
+class _Bucket:
+    def __init__(self, rate, capacity):
+        self.rate, self.capacity = rate, capacity
+        self.tokens, self.updated = capacity, time.monotonic()
+
+    def wait(self):
+        """Через сколько секунд появится токен (0 - уже есть)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class StubBotApi:
+    def __init__(self, on_message=None, flood_limits=None):
+        self.on_message = on_message  # вызывается как on_message(chat_id, text) для каждого sendMessage
+        self.calls = {}                # метод -> число вызовов
+        # (сообщений в секунду на бота, запас, сообщений в секунду на чат, запас) или None
+        self.flood_limits = flood_limits
+        self.flooded = 0               # число ответов 429
+        self._global = None
+        self._chats = {}
+        self._message_ids = itertools.count(1)
+        self._runner = None
+        self.url = None
+
+    async def _params(self, request):
+        if request.content_type == 'application/json':
+            return await request.json()
+        params = dict(await request.post())
+        for key, value in params.items():
+            if isinstance(value, str) and value[:1] in '[{':
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return params
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id', 0))
+            if self.on_message is not None:
+                self.on_message(chat_id, params.get('text', ''))
+            return {'message_id': next(self._message_ids), 'date': int(time.time()), 'from': BOT_USER,
+                    'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', '')}
+        return True
+
+    def _retry_after(self, method, params):
+        if self.flood_limits is None or not method.startswith('send'):
+            return 0
+        global_rate, global_burst, chat_rate, chat_burst = self.flood_limits
+        if self._global is None:
+            self._global = _Bucket(global_rate, global_burst)
+        chat_id = params.get('chat_id')
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Bucket(chat_rate, chat_burst)
+        retry_after = max(chat.wait(), self._global.wait())
+        if not retry_after:
+            chat.tokens -= 1
+            self._global.tokens -= 1
+        return retry_after
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = await self._params(request)
+        retry_after = self._retry_after(method, params)
+        if retry_after:
+            self.flooded += 1
+            seconds = math.ceil(retry_after)
+            return web.json_response({'ok': False, 'error_code': 429, 'parameters': {'retry_after': seconds},
+                                      'description': f'Too Many Requests: retry after {seconds}'}, status=429)
+        return web.json_response({'ok': True, 'result': self._result(method, params)})
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}'
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class FakeBotApi(BaseRequest):
+    """Bot API в памяти процесса: правдоподобные ответы без сети и счетчик вызовов"""
+
+    def __init__(self):
+        self.calls = 0
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        name = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if name == 'getMe':
+            result = BOT_USER
+        elif name in ('sendMessage', 'editMessageText', 'sendDocument'):
+            result = {'message_id': next(self._message_ids), 'date': int(time.time()), 'text': params.get('text', ''),
+                      'chat': {'id': int(params['chat_id']), 'type': 'private'}, 'from': BOT_USER}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
@@ -0,0 +1,164 @@
+import csv
+import json
+import re
+
+# Потоковый импорт и экспорт вопросов теста.
+# CSV: строки вида  текст,варианты через |,номер правильного варианта (с 1); первая строка может быть заголовком.
+# | и \ внутри варианта записываются как \| и \\.
+# JSON: массив объектов {"text": ..., "answers": [...], "correct": номер с 1} или JSON Lines.
+# Файл читается по частям, поэтому память не зависит от числа вопросов.
+
+MAX_QUESTIONS = 65535  # номер вопроса в callback_data занимает 2 байта
+MAX_ANSWERS = 100      # больше кнопок Telegram в одну клавиатуру не принимает
+CHUNK_SIZE = 64 * 1024
+ANSWERS_SEPARATOR = '|'
+_ANSWER_TOKEN = re.compile(r'\\[\\|]|\||[^\\|]+|\\')  # экранированный символ, разделитель, текст
+
+
+def detect_format(filename: str, fileobj) -> str:
+    """'csv' или 'json' по расширению, иначе по первому значащему символу"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.json', '.jsonl')):
+        return 'json'
+    start = fileobj.read(CHUNK_SIZE).lstrip()
+    fileobj.seek(0)
+    return 'json' if start[:1] in ('[', '{') else 'csv'
+
+
+def iter_csv(fileobj):
+    """Строки CSV как словари {'text', 'answers', 'correct'}"""
+    reader = csv.reader(fileobj)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # Испорченная строка (например, поле длиннее csv.field_size_limit) - дальше
+            # разбор ненадежен, сообщаем об ошибке как о неверном вопросе
+            yield {'error': f'некорректный CSV: {e}'}
+            return
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if len(row) != 3:
+            yield {'error': f'ожидалось 3 столбца, получено {len(row)}'}
+            continue
+        text, answers, correct = row
+        if correct.strip().lower() == 'correct':
+            continue  # заголовок
+        correct = correct.strip()
+        yield {'text': text, 'answers': split_answers(answers),
+               'correct': int(correct) if correct.isdecimal() else correct}
+
+
+def split_answers(cell: str) -> list:
+    r"""Варианты из ячейки CSV: разделитель |, \| и \\ - символы внутри варианта"""
+    answers, current = [], ''
+    for token in _ANSWER_TOKEN.findall(cell):
+        if token == ANSWERS_SEPARATOR:
+            answers.append(current)
+            current = ''
+        else:
+            current += token[1] if len(token) == 2 and token[0] == '\\' else token
+    answers.append(current)
+    return answers
+
+
+def join_answers(answers) -> str:
+    return ANSWERS_SEPARATOR.join(answer.replace('\\', '\\\\').replace('|', '\\|') for answer in answers)
+
+
+def iter_json(fileobj):
+    """Объекты из JSON-массива или JSON Lines, без чтения файла целиком"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while True:
+        # Пропускаем разделители между объектами
+        buffer = buffer.lstrip(' \t\r\n,[]')
+        if not buffer:
+            if eof:
+                return
+            chunk = fileobj.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof or len(buffer) > CHUNK_SIZE:
+                # Объект не закончился и за целую часть файла - дальше читать бессмысленно,
+                # а буфер рос бы до конца файла
+                yield {'error': 'некорректный JSON или слишком длинный вопрос'}
+                return
+            chunk = fileobj.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield obj if isinstance(obj, dict) else {'error': 'ожидался объект'}
+
+
+def to_question(row: dict) -> dict:
+    """Проверяет строку и превращает ее в вопрос хранилища; при ошибке - ValueError"""
+    if 'error' in row:
+        raise ValueError(row['error'])
+    text = str(row.get('text', '')).strip()
+    if not text:
+        raise ValueError('пустой текст вопроса')
+    if not isinstance(row.get('answers'), list):
+        raise ValueError('варианты ответа должны быть списком')
+    answers = [str(answer).strip() for answer in row['answers']]
+    if not 2 <= len(answers) <= MAX_ANSWERS or not all(answers):
+        raise ValueError(f'должно быть от 2 до {MAX_ANSWERS} непустых вариантов ответа')
+    correct = row.get('correct')
+    if not isinstance(correct, int) or isinstance(correct, bool):
+        raise ValueError('номер правильного ответа должен быть целым числом')
+    correct -= 1
+    if not 0 <= correct < len(answers):
+        raise ValueError(f'номер правильного ответа должен быть от 1 до {len(answers)}')
+    return {'text': text, 'answers': answers, 'correct_answer': answers[correct], 'correct_index': correct}
+
+
+def iter_rows(fileobj, fmt: str):
+    return iter_csv(fileobj) if fmt == 'csv' else iter_json(fileobj)
+
+
+def validate(fileobj, fmt: str, max_errors: int = 10):
+    """Первый проход: считает вопросы и собирает до max_errors ошибок с номерами вопросов"""
+    count, errors = 0, []
+    for count, row in enumerate(iter_rows(fileobj, fmt), 1):
+        try:
+            to_question(row)
+        except ValueError as e:
+            if len(errors) < max_errors:
+                errors.append(f'Вопрос {count}: {e}')
+    if count > MAX_QUESTIONS:
+        errors.append(f'Слишком много вопросов: {count}, максимум {MAX_QUESTIONS}')
+    fileobj.seek(0)
+    return count, errors
+
+
+def iter_questions(fileobj, fmt: str):
+    """Второй проход: вопросы для записи в хранилище (файл уже проверен)"""
+    for row in iter_rows(fileobj, fmt):
+        yield to_question(row)
+
+
+def write_csv(fileobj, questions) -> None:
+    writer = csv.writer(fileobj)
+    writer.writerow(['text', 'answers', 'correct'])
+    for question in questions:
+        writer.writerow([question['text'], join_answers(question['answers']),
+                         question['correct_index'] + 1])
+
+
+def write_json(fileobj, questions) -> None:
+    fileobj.write('[')
+    for i, question in enumerate(questions):
+        fileobj.write(',\n' if i else '\n')
+        json.dump({'text': question['text'], 'answers': question['answers'],
+                   'correct': question['correct_index'] + 1}, fileobj, ensure_ascii=False)
+    fileobj.write('\n]\n')
@@ -0,0 +1,43 @@
+import base64
+import struct
+from functools import lru_cache
+
+# Компактный формат callback_data для кнопок тестов и ответов.
+# Telegram ограничивает callback_data 64 байтами, поэтому вместо названия теста
+# и текста ответа в кнопку кладутся числа: вид кнопки, id теста, номер вопроса
+# и номер варианта, упакованные в 8 байт и закодированные base64url (11 символов).
+
+TEST = 1
+ANSWER = 2
+
+_FORMAT = struct.Struct('>BIHB')  # вид, id теста, номер вопроса, номер варианта
+_LENGTH = 11                      # длина base64 от 8 байт без '='
+
+
+def _encode(kind: int, test_id: int, question: int = 0, option: int = 0) -> str:
+    return base64.urlsafe_b64encode(_FORMAT.pack(kind, test_id, question, option)).rstrip(b'=').decode()
+
+
+def encode_test(test_id: int) -> str:
+    """callback_data кнопки выбора теста"""
+    return _encode(TEST, test_id)
+
+
+def encode_answer(test_id: int, question: int, option: int) -> str:
+    """callback_data кнопки варианта ответа"""
+    return _encode(ANSWER, test_id, question, option)
+
+
+@lru_cache(maxsize=65536)
+def decode(data: str):
+    """Возвращает (вид, id теста, номер вопроса, номер варианта) или None для чужих данных.
+
+    Кнопок у опубликованных тестов конечное число, поэтому повторные нажатия разбираются из кэша.
+    """
+    if len(data) != _LENGTH:
+        return None
+    try:
+        decoded = _FORMAT.unpack(base64.urlsafe_b64decode(data + '='))
+    except (ValueError, struct.error):
+        return None
+    return decoded if decoded[0] in (TEST, ANSWER) else None
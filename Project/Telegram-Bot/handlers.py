@@ -0,0 +1,868 @@
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+import uuid
+from array import array
+import aiohttp
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, filters, ContextTypes
+import auth_client
+import token_cache
+import storage
+import leaderboard
+import results
+from keyboards import KeyboardCache, answers_keyboard, tests_keyboard
+import search
+import callbacks
+from scheduler import DeadlineScheduler
+import bulk
+import metrics
+
+# Обработчики команд бота и их общее состояние.
+# Импорт модуля ничего не создает: хранилища, рейтинг и планировщик появляются в
+# init_services(), который вызывает фабрика приложения (main.create_application).
+# NumPy для /stats и клиент Redis загружаются при первом обращении к ним.
+
+logger = logging.getLogger(__name__)
+
+# Пример URL для вашего API
+SERVER_URL = "https://loving-beetle-sharing.ngrok-free.app/"  # URL сервера
+
+# Состояния для аутентификации
+ASK_EMAIL, ASK_PASSWORD = range(2)
+
+def generate_token():
+    """Генерирует случайный токен"""
+    return str(uuid.uuid4())
+
+_sessions = None
+
+def get_sessions() -> token_cache.SessionCache:
+    """Сессии авторизации: Redis с TTL и кэш в памяти процесса"""
+    global _sessions
+    if _sessions is None:
+        _sessions = token_cache.SessionCache(auth_client.get_redis())
+    return _sessions
+
+async def login(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id  # Получаем chat_id пользователя
+
+    # Проверяем, есть ли сессия в кэше или в Redis
+    user_status = await get_sessions().get(chat_id)
+
+    if user_status is None:
+        # Если ключа нет, отправляем сообщение о том, что пользователь не авторизован
+        await update.message.reply_text(
+            "Вы не заголинены! Пожалуйста, авторизуйтесь через:\n"
+            "- GitHub\n"
+            "- Яндекс ID\n"
+            "- Введите код (например: /login type=<тип>)"
+        )
+    else:
+        # Если пользователь уже авторизован, уведомляем его
+        await update.message.reply_text("Вы уже авторизованы.")
+
+async def login_with_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    token = generate_token()  # Функция, генерирующая токен
+
+    # Сохраняем статус и токен в Redis; ключ истечет через AUTH_SESSION_TTL
+    await get_sessions().set(chat_id, f"Anonymous:{token}")
+
+    # Теперь делаем запрос к модулю авторизации через общую сессию
+    try:
+        status, _ = await auth_client.post_json(SERVER_URL, {"token": token})
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Ошибка запроса к модулю авторизации: {e}")
+        status = None
+
+    if status == 200:
+        # Обработка успешного ответа
+        await update.message.reply_text("Вы успешно авторизованы.")
+    else:
+        # Обработка ошибки
+        await update.message.reply_text("Ошибка авторизации. Пожалуйста, попробуйте снова.")
+
+# Функция для аутентификации пользователя
+async def authenticate_user(email: str, password: str) -> str:
+    """Отправка данных на сервер; возвращает JWT сессии или None"""
+    try:
+        status, data = await auth_client.post_json(SERVER_URL, {'email': email, 'password': password})
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Ошибка запроса к модулю авторизации: {e}")
+        return None
+    if status != 200:
+        return None  # Ошибка при аутентификации
+    if data.get('access_token'):
+        return data['access_token']
+    # Сервер вернул только роль - выпускаем токен сами тем же секретом, чтобы роль истекала
+    return token_cache.sign_jwt({'roles': [data.get('role', 'user')],
+                                 'exp': int(time.time()) + token_cache.AUTH_SESSION_TTL})
+
+async def start_login_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+   """Запускает процесс аутентификации"""
+   await update.message.reply_text('Введите вашу почту:')
+   return ASK_EMAIL
+
+
+# Сохранение почты пользователя и запрос пароля
+async def ask_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Запрос почты"""
+    user_email = update.message.text.strip()
+    if not user_email:
+        await update.message.reply_text('Пожалуйста, введите корректный email.')
+        return ASK_EMAIL
+    context.user_data['email'] = user_email  # Сохраняем email
+    await update.message.reply_text('Введите ваш пароль:')
+    return ASK_PASSWORD
+
+# Сохранение пароля и аутентификация
+async def ask_password(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Запрос пароля и аутентификация"""
+    user_password = update.message.text.strip()
+    if not user_password:
+        await update.message.reply_text('Пожалуйста, введите корректный пароль.')
+        return ASK_PASSWORD
+
+    email = context.user_data.pop('email')  # Получаем сохраненную почту
+    if not token_cache.JWT_SECRET_KEY:
+        # Без секрета токен не проверить и не выпустить - это ошибка настройки, а не неверный пароль
+        logger.error('Вход по почте невозможен: не задан JWT_SECRET_KEY')
+        await update.message.reply_text('Вход по почте временно недоступен из-за ошибки настройки бота. '
+                                        'Сообщите администратору.')
+        return ConversationHandler.END
+    # Отправляем данные на сервер для аутентификации
+    token = await authenticate_user(email, user_password)
+    claims = get_sessions().claims(token) if token else None
+
+    if claims is None:
+        await update.message.reply_text('Неверная почта или пароль. Попробуйте еще раз.')
+        return ConversationHandler.END  # Завершаем, если ошибка аутентификации
+
+    # Сессия живет в Redis столько же, сколько токен
+    ttl = claims['exp'] - time.time() if 'exp' in claims else None
+    await get_sessions().set(update.effective_chat.id, token, ttl)
+
+    if 'admin' in get_sessions().roles(token):
+        await update.message.reply_text(f'Здравствуйте, {update.message.from_user.first_name}! Вы администратор.')
+    else:
+        await update.message.reply_text(f'Здравствуйте, {update.message.from_user.first_name}! Вы обычный пользователь.')
+
+    return ConversationHandler.END  # Завершаем разговор
+
+# Функция, которая проверяет роль пользователя перед выполнением команды
+async def restricted_access(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда, доступная только администраторам"""
+    sessions = get_sessions()
+    if 'admin' not in sessions.roles(await sessions.get(update.effective_chat.id)):
+        await update.message.reply_text('У вас нет доступа к этой команде, потому что вы не администратор.')
+    else:
+        await update.message.reply_text('Доступ к админ-команде получен.')
+
+# Функция для проверки JWT-токена перед выполнением команды
+async def check_jwt_token(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Проверка JWT-токена перед выполнением команды"""
+    sessions = get_sessions()
+    session = await sessions.get(update.effective_chat.id)
+    if not session:
+        await update.message.reply_text('У вас нет доступа к этой команде, так как вы не администратор.')
+    elif sessions.claims(session) is None:
+        # Подпись не сошлась или срок действия токена истек - проверяется локально, без запроса к серверу
+        await update.message.reply_text('Ваш токен недействителен. Вы не имеете доступа к администраторским функциям.')
+    elif 'admin' not in sessions.roles(session):
+        await update.message.reply_text('У вас нет доступа к этой команде, так как вы не администратор.')
+    else:
+        await update.message.reply_text('JWT-токен проверен. Доступ к админ-команде получен.')
+
+# Переменные для хранения данных о тестах и баллах; создаются в init_services()
+test_store = None
+result_store = None    # журнал попыток и сводки по пользователям и тестам
+test_analytics = None  # матрицы ответов для /stats; создаются при первом /stats
+rankings = None
+# Готовые клавиатуры вопросов и страниц списка тестов
+keyboards = None
+# Сроки попыток: окончание времени на тест и простой без ответа
+deadlines = None
+# Поисковый индекс по названиям и вопросам; строится в фоне после запуска бота
+search_index = None
+_search_build = None  # задача фонового построения индекса
+
+
+def init_services() -> None:
+    """Создает хранилища тестов и результатов, рейтинг, кэш клавиатур и планировщик сроков"""
+    global test_store, result_store, test_analytics, rankings, keyboards, deadlines, search_index, _search_build
+    test_store = storage.create_store()
+    result_store = results.create_result_store()
+    # Журнал может пережить хранилище тестов (например, тесты в памяти) - новые тесты
+    # не должны получить id, под которыми в нем уже лежат чужие попытки
+    test_store.reserve_ids(result_store.last_test_id())
+    test_analytics = None
+    rankings = leaderboard.create_leaderboard()
+    if isinstance(rankings, leaderboard.Leaderboard):
+        # Рейтинг в памяти пуст после перезапуска, а журнал попыток мог сохраниться
+        rankings.load(result_store.iter_bests())
+    keyboards = KeyboardCache(test_store)
+    deadlines = DeadlineScheduler()
+    search_index = None
+    _search_build = None
+    if not token_cache.JWT_SECRET_KEY:
+        logger.warning('JWT_SECRET_KEY не задан: вход по почте и паролю (/login) работать не будет')
+
+
+def get_analytics():
+    """Аналитика /stats; NumPy импортируется при первом вызове. None, если NumPy не установлен"""
+    global test_analytics
+    if test_analytics is None:
+        try:
+            import analytics
+        except ImportError:  # без NumPy /stats показывает только сводку по попыткам
+            return None
+        test_analytics = analytics.TestAnalytics(result_store)
+    return test_analytics
+
+
+def start_search_index() -> None:
+    """Запускает фоновое построение поискового индекса из хранилища, если оно еще не начато"""
+    global search_index, _search_build
+    if search_index is not None:
+        return
+    # Индекс доступен обработчикам сразу: созданные и удаленные во время построения тесты
+    # попадают в него как обычно, а /search отвечает, что индекс загружается
+    search_index = search.SearchIndex()
+    _search_build = asyncio.create_task(search_index.build(test_store.iter_documents()))
+    _search_build.add_done_callback(_search_built)
+
+def _search_built(task) -> None:
+    global search_index
+    if task.cancelled() or task.exception() is None:
+        return
+    logger.error('Не удалось построить поисковый индекс', exc_info=task.exception())
+    search_index = None  # следующий /search начнет построение заново
+
+def get_search_index():
+    """Поисковый индекс тестов или None, пока он строится"""
+    start_search_index()
+    return search_index if search_index.ready else None
+
+# Через сколько секунд без ответа попытка без ограничения времени считается брошенной
+ATTEMPT_IDLE_TIMEOUT = int(os.getenv('ATTEMPT_IDLE_TIMEOUT', '3600'))
+# Ключи user_data, которые относятся к текущей попытке прохождения теста
+ATTEMPT_KEYS = ('current_test', 'current_test_id', 'current_question_index', 'correct_answers',
+                'time_limit', 'start_time', 'chat_id', 'user_name', 'choices', 'marks',
+                'order', 'shuffle', 'option_order')
+
+# Сколько участников показывать на одной странице /list_rankings
+RANKINGS_PAGE_SIZE = 10
+# Сколько названий показывать в /list; остальные тесты находятся через /search
+LIST_LIMIT = 50
+# Сколько найденных тестов показывать на одной странице /search
+SEARCH_PAGE_SIZE = 10
+
+# Список команд для подсказок пользователю
+COMMANDS_TEXT = ('/create для создания собственного теста\n'
+                 '/tests для просмотра списка доступных тестов\n'
+                 '/search для поиска теста по названию или словам из вопросов\n'
+                 '/view_results для просмотра своих результатов\n'
+                 '/list_rankings для ранжирования участников\n'
+                 '/stats для статистики прохождения своего теста\n'
+                 '/shuffle для перемешивания вопросов и выдачи части вопросов в своем тесте\n'
+                 '/delete для удаления своего теста\n'
+                 '/import для загрузки теста из файла CSV или JSON (название в подписи к файлу)\n'
+                 '/export для выгрузки своего теста в файл.')
+START_TEXT = f'Привет! Я бот для создания и прохождения тестов. Используйте:\n{COMMANDS_TEXT}'
+HELP_TEXT = f'Вы можете использовать:\n{COMMANDS_TEXT}'
+
+# Состояния для обработки создания теста
+CREATE_TEST, SET_TIME_LIMIT, ADD_QUESTION_TEXT, ADD_ANSWERS, SELECT_CORRECT_ANSWER, FINISH_CREATION, TESTS_TEST, ASK_QUESTION, CHECK_ANSWER, DELETE_TEST, CONFIRM_DELETE, DEFAULT_TYPE = range(12)
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(START_TEXT)
+
+async def list_tests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if len(test_store):
+        names = test_store.names()
+        test_list = '\n'.join(names[:LIST_LIMIT])
+        if len(names) > LIST_LIMIT:
+            test_list += f'\n... и еще {len(names) - LIST_LIMIT}. Используйте /search <запрос> для поиска.'
+        await update.message.reply_text(f'Доступные тесты:\n{test_list}')
+    else:
+        await update.message.reply_text('Нет доступных тестов.')
+
+async def create(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text('Введите название теста:')
+    return CREATE_TEST
+
+async def create_test(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    test_name = update.message.text.strip()
+    if not test_name:
+        await update.message.reply_text('Название теста не может быть пустым. Пожалуйста, введите название теста:')
+        return CREATE_TEST
+    test_id = test_store.create(test_name, update.message.from_user.id)
+    if test_id is None:
+        await update.message.reply_text(f'Тест "{test_name}" уже существует. Пожалуйста, введите другое название теста:')
+        return CREATE_TEST
+    keyboards.invalidate_catalog()
+    if search_index is not None:
+        search_index.add(test_id, test_name)
+    context.user_data['current_test'] = test_name
+    await update.message.reply_text(f'Тест "{test_name}" создан. Установите время для прохождения теста (в минутах):')
+    return SET_TIME_LIMIT
+
+async def set_time_limit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    time_limit = update.message.text.strip()
+    if not time_limit.isdigit():
+        await update.message.reply_text('Время должно быть числом. Пожалуйста, введите время для прохождения теста (в минутах):')
+        return SET_TIME_LIMIT
+    test_store.set_time_limit(context.user_data['current_test'], int(time_limit))
+    await update.message.reply_text(f'Время для прохождения теста установлено на {time_limit} минут. Добавьте вопросы с помощью /add_question.')
+    return ADD_QUESTION_TEXT
+
+async def add_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text('Введите вопрос:')
+    return ADD_QUESTION_TEXT
+
+async def add_question_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    question_text = update.message.text.strip()
+    if not question_text:
+        await update.message.reply_text('Текст вопроса не может быть пустым. Пожалуйста, введите вопрос:')
+        return ADD_QUESTION_TEXT
+    context.user_data['current_question'] = question_text
+    await update.message.reply_text('Введите варианты ответов через запятую:')
+    return ADD_ANSWERS
+
+async def add_answers(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    answers = [answer.strip() for answer in update.message.text.split(',')]
+    if len(answers) < 2:
+        await update.message.reply_text('Должно быть как минимум два варианта ответа. Пожалуйста, введите варианты ответов через запятую:')
+        return ADD_ANSWERS
+    context.user_data['current_answers'] = answers
+    keyboard = [[InlineKeyboardButton(answer, callback_data=f'correct_{i}')] for i, answer in enumerate(answers)]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text('Выберите правильный ответ:', reply_markup=reply_markup)
+    return SELECT_CORRECT_ANSWER
+
+async def select_correct_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    correct_index = int(query.data.replace('correct_', ''))
+    question = {
+        'text': context.user_data['current_question'],
+        'answers': context.user_data['current_answers'],
+        'correct_answer': context.user_data['current_answers'][correct_index],
+        'correct_index': correct_index
+    }
+    test_store.add_questions(context.user_data['current_test'], [question])
+    keyboards.invalidate_test(context.user_data['current_test'])
+    if search_index is not None:
+        search_index.add(test_store.get_id(context.user_data['current_test']), texts=[question['text']])
+    keyboard = [
+        [InlineKeyboardButton("Добавить еще вопрос", callback_data='add_question')],
+        [InlineKeyboardButton("Завершить создание теста", callback_data='finish_creation')]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.message.reply_text('Что вы хотите сделать дальше?', reply_markup=reply_markup)
+    return FINISH_CREATION
+
+async def finish_creation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    if query.data == 'add_question':
+        await query.message.reply_text('Введите вопрос:')
+        return ADD_QUESTION_TEXT
+    elif query.data == 'finish_creation':
+        await query.message.reply_text(f'Тест создан! {HELP_TEXT}')
+        return ConversationHandler.END
+
+
+async def tests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    if not len(test_store):
+        await update.message.reply_text('Нет доступных тестов.')
+        return ConversationHandler.END
+    reply_markup = keyboards.tests_page(0)
+    await update.message.reply_text('Выберите тест для прохождения:', reply_markup=reply_markup)
+    return TESTS_TEST
+
+async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    if query.data.startswith('tests_page_'):
+        # Листание списка тестов: меняем только клавиатуру у того же сообщения
+        page = min(int(query.data.replace('tests_page_', '')), keyboards.pages() - 1)
+        await query.edit_message_reply_markup(reply_markup=keyboards.tests_page(page))
+        return TESTS_TEST
+    if query.data.startswith('search_page_'):
+        # Листание результатов /search: запрос хранится в user_data, в кнопке только номер страницы
+        if 'search_query' in context.user_data:
+            text, reply_markup = search_page(context.user_data['search_query'],
+                                             int(query.data.replace('search_page_', '')))
+            await query.edit_message_text(text, reply_markup=reply_markup)
+        return None
+    decoded = callbacks.decode(query.data)
+    if decoded is None:
+        return None
+    kind, test_id, _, _ = decoded
+    if kind == callbacks.TEST:
+        test_name = test_store.get_name(test_id)
+        if test_name is None:
+            await query.message.reply_text('Тест не найден. Возможно, он был удален.')
+            return ConversationHandler.END
+        if not test_store.question_count(test_name):
+            # Создатель еще не добавил вопросы: попытку не начинаем и текущую не трогаем
+            await query.message.reply_text('В этом тесте пока нет вопросов.')
+            return None
+        for key in ATTEMPT_KEYS:
+            context.user_data.pop(key, None)  # остатки предыдущей попытки
+        context.user_data['current_test'] = test_name
+        context.user_data['current_test_id'] = test_id
+        context.user_data['current_question_index'] = 0
+        context.user_data['correct_answers'] = 0
+        context.user_data['choices'] = bytearray()  # выбранный вариант на каждый вопрос
+        context.user_data['marks'] = bytearray()    # 1 - ответ верный, 0 - нет
+        context.user_data['start_time'] = time.time()
+        context.user_data['chat_id'] = query.message.chat_id
+        context.user_data['user_name'] = query.from_user.first_name
+        test = test_store.get(test_name)
+        time_limit = test['time_limit']
+        order = draw_questions(test)
+        if order is not None:
+            context.user_data['order'] = order
+        if test['shuffle']:
+            context.user_data['shuffle'] = True
+        notice = None
+        if time_limit:
+            context.user_data['time_limit'] = time_limit
+            minutes, seconds = divmod(time_limit * 60, 60)
+            notice = f'У вас есть {minutes} минут и {seconds} секунд для прохождения теста.'
+        schedule_attempt_deadline(context.application, query.from_user.id, context.user_data)
+        await ask_question(update, context, notice)
+        return ASK_QUESTION
+    elif kind == callbacks.ANSWER:
+        await check_answer(update, context)
+        return CHECK_ANSWER
+
+def draw_questions(test: dict):
+    """Номера вопросов теста для новой попытки (array) или None, если вопросы идут все и по порядку"""
+    count = len(test['questions'])
+    pool_size = min(test['pool_size'] or count, count)
+    if pool_size == count and not test['shuffle']:
+        return None
+    order = random.sample(range(count), pool_size)
+    if not test['shuffle']:
+        order.sort()  # пул без перемешивания: выбранные вопросы идут в порядке теста
+    return array('H', order)
+
+def attempt_question(user_data: dict) -> int:
+    """Номер в тесте текущего вопроса попытки"""
+    order = user_data.get('order')
+    position = user_data['current_question_index']
+    return order[position] if order is not None else position
+
+def attempt_length(user_data: dict) -> int:
+    """Сколько вопросов в текущей попытке"""
+    order = user_data.get('order')
+    return len(order) if order is not None else test_store.question_count(user_data['current_test'])
+
+async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE, notice: str = None) -> int:
+    query = update.callback_query
+    test_name = context.user_data['current_test']
+    question_index = attempt_question(context.user_data)
+    question_text, reply_markup = keyboards.question(test_name, question_index)
+    if context.user_data.get('shuffle'):
+        # Варианты в случайном порядке: в кнопке номер показанного варианта, а перестановка
+        # текущего вопроса хранится в user_data (байт на вариант)
+        answers = test_store.get_question(test_name, question_index)['answers']
+        option_order = bytes(random.sample(range(len(answers)), len(answers)))
+        context.user_data['option_order'] = option_order
+        reply_markup = answers_keyboard(context.user_data['current_test_id'], question_index, answers, option_order)
+    if notice:
+        # Напоминание о времени уходит тем же сообщением, что и вопрос: меньше отправок в чат
+        question_text = f'{notice}\n\n{question_text}'
+    await query.message.reply_text(question_text, reply_markup=reply_markup)
+    return CHECK_ANSWER
+
+async def view_results(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.message.from_user.id
+    user_name = update.message.from_user.first_name
+    user_results = result_store.user_results(user_id)
+    if not user_results:
+        await update.message.reply_text('У вас нет результатов.')
+        return
+
+    lines = '\n'.join([f'Тест: {r["test_name"]}, лучший результат: {r["best"]}/{r["total"]}, '
+                       f'последний: {r["last"]}/{r["total"]}, средний: {r["average"]:.1f}, попыток: {r["attempts"]}'
+                       for r in user_results])
+    await update.message.reply_text(f'Пользователь: {user_name}\nРезультаты:\n{lines}\n\n{HELP_TEXT}')
+
+def by_question(order, values, count: int) -> bytearray:
+    """Значения по позициям попытки -> по номерам вопросов теста; 0xff у незаданных вопросов"""
+    result = bytearray(b'\xff' * count)
+    for position, value in enumerate(values):
+        result[order[position]] = value
+    return result
+
+async def record_attempt(user_id: int, user_data: dict):
+    """Завершает попытку: пишет ее в журнал, обновляет рейтинг и очищает состояние.
+    Возвращает (правильных ответов, всего вопросов)"""
+    test_name = user_data['current_test']
+    correct_answers = user_data.get('correct_answers', 0)
+    total_questions = attempt_length(user_data)
+    choices = user_data.get('choices', b'')
+    marks = user_data.get('marks', b'')
+    order = user_data.get('order')
+    if order is not None:
+        # В журнал выбор и отметки пишутся по номерам вопросов теста, как у попыток без пула;
+        # 0xff - вопрос не задан
+        choices, marks = (by_question(order, values, test_store.question_count(test_name))
+                          for values in (choices, marks))
+    test_id, user_name = user_data['current_test_id'], user_data.get('user_name', '')
+    result_store.record({
+        'user_id': user_id, 'user_name': user_name, 'test_id': test_id, 'test_name': test_name,
+        'started': user_data['start_time'], 'finished': time.time(), 'score': correct_answers,
+        'total': total_questions, 'choices': choices, 'marks': marks,
+    })
+    if test_analytics is not None:
+        test_analytics.record(test_id, bytes(choices))
+    clear_attempt(user_id, user_data)
+    # Рейтинг сам хранит лучшие результаты по тестам и прибавляет только прирост
+    await rankings.record(user_id, user_name, test_id, correct_answers)
+    return correct_answers, total_questions
+
+def clear_attempt(user_id: int, user_data: dict) -> None:
+    """Очищает состояние попытки и снимает ее срок"""
+    for key in ATTEMPT_KEYS:
+        user_data.pop(key, None)
+    deadlines.cancel(user_id)
+
+def schedule_attempt_deadline(application, user_id: int, user_data: dict) -> None:
+    """Назначает срок попытки: конец лимита времени или, без лимита, простой ATTEMPT_IDLE_TIMEOUT"""
+    if user_data.get('time_limit'):
+        deadline = user_data['start_time'] + user_data['time_limit'] * 60
+    else:
+        deadline = time.time() + ATTEMPT_IDLE_TIMEOUT
+    deadlines.schedule(user_id, deadline, lambda: expire_attempt(application, user_id))
+
+def restore_attempt_deadlines(application) -> None:
+    """Заново назначает сроки попыток, восстановленных из persistence после перезапуска"""
+    for user_id, user_data in application.user_data.items():
+        # current_test есть и у создателя теста, попытку отмечает только current_test_id
+        if 'current_test_id' in user_data:
+            schedule_attempt_deadline(application, user_id, user_data)
+
+async def finish_attempt(bot, user_id: int, user_data: dict, text: str) -> None:
+    """Досрочно завершает попытку: сохраняет набранные баллы и очищает ее состояние"""
+    if 'current_test_id' not in user_data:
+        return
+    chat_id = user_data.get('chat_id', user_id)
+    if test_store.get_name(user_data['current_test_id']) != user_data['current_test']:
+        clear_attempt(user_id, user_data)
+        await bot.send_message(chat_id, 'Тест был удален, попытка завершена.')
+        return
+    correct_answers, total_questions = await record_attempt(user_id, user_data)
+    await bot.send_message(chat_id, f'{text} Количество правильных ответов: {correct_answers}/{total_questions}')
+
+async def expire_attempt(application, user_id: int) -> None:
+    """Вызывается планировщиком, когда срок попытки истек"""
+    user_data = application.user_data.get(user_id)
+    if not user_data or 'current_test_id' not in user_data:
+        return
+    if user_data.get('time_limit'):
+        text = 'Время на прохождение теста истекло.'
+    else:
+        text = 'Попытка завершена из-за долгого отсутствия ответа.'
+    await finish_attempt(application.bot, user_id, user_data, text)
+    # Срок истек вне обработки обновления - сами отмечаем изменение для persistence,
+    # иначе после перезапуска попытка восстановится и будет засчитана второй раз
+    if not user_data:
+        application.drop_user_data(user_id)  # больше ничего не храним для этого пользователя
+    else:
+        application.mark_data_for_update_persistence(user_ids=user_id)
+
+async def check_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    if 'current_test_id' not in context.user_data:
+        # Попытка уже завершена планировщиком (current_test без id - это создание теста)
+        await query.message.reply_text(f'Эта попытка уже завершена. {HELP_TEXT}')
+        return ConversationHandler.END
+    time_limit = context.user_data.get('time_limit')
+    if time_limit and time.time() >= context.user_data['start_time'] + time_limit * 60:
+        await finish_attempt(context.bot, query.from_user.id, context.user_data, 'Время на прохождение теста истекло.')
+        return ConversationHandler.END
+    decoded = callbacks.decode(query.data)
+    test_name = context.user_data['current_test']
+    question_index = attempt_question(context.user_data)
+    option_order = context.user_data.get('option_order')
+    if (decoded is None or decoded[0] != callbacks.ANSWER or decoded[1] != context.user_data['current_test_id']
+            or decoded[2] != question_index or (option_order is not None and decoded[3] >= len(option_order))):
+        # Кнопка от другого теста или уже отвеченного вопроса - не засчитываем повторно
+        return ASK_QUESTION
+    # Показанный вариант -> вариант в тесте через перестановку текущего вопроса
+    option = option_order[decoded[3]] if option_order is not None else decoded[3]
+    question = test_store.get_question(test_name, question_index)
+    if question is None:
+        # Создатель удалил тест во время попытки - засчитывать нечего
+        clear_attempt(query.from_user.id, context.user_data)
+        await query.message.reply_text(f'Тест был удален, попытка завершена. {HELP_TEXT}')
+        return ConversationHandler.END
+    correct = option == question['correct_index']
+    context.user_data['correct_answers'] += correct
+    context.user_data.setdefault('choices', bytearray()).append(option)
+    context.user_data.setdefault('marks', bytearray()).append(correct)
+    context.user_data['current_question_index'] += 1
+    total_questions = attempt_length(context.user_data)
+    if context.user_data['current_question_index'] < total_questions:
+        notice = None
+        if time_limit:
+            elapsed_time = time.time() - context.user_data['start_time']
+            remaining_time = time_limit * 60 - elapsed_time
+            minutes, seconds = divmod(remaining_time, 60)
+            notice = f'Осталось {int(minutes)} минут и {int(seconds)} секунд.'
+        else:
+            schedule_attempt_deadline(context.application, query.from_user.id, context.user_data)  # продлеваем срок простоя
+        await ask_question(update, context, notice)
+        return ASK_QUESTION
+    else:
+        correct_answers, total_questions = await record_attempt(query.from_user.id, context.user_data)
+        await query.message.reply_text(f'Вы завершили тест! Количество правильных ответов: '
+                                       f'{correct_answers}/{total_questions}\n\n{HELP_TEXT}')
+        return ConversationHandler.END
+
+async def list_rankings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    total_users = await rankings.count()
+    if total_users:
+        # Номер страницы можно передать аргументом: /list_rankings 2
+        page = int(context.args[0]) if context.args and context.args[0].isdigit() else 1
+        pages = (total_users + RANKINGS_PAGE_SIZE - 1) // RANKINGS_PAGE_SIZE
+        page = min(max(page, 1), pages)
+        entries = await rankings.page((page - 1) * RANKINGS_PAGE_SIZE, RANKINGS_PAGE_SIZE)
+        ranking_list = '\n'.join([f'{place}. {user_name}: {score} баллов' for place, user_name, score in entries])
+        text = f'Рейтинг участников (страница {page} из {pages}):\n{ranking_list}'
+        own = await rankings.rank(update.message.from_user.id)
+        if own:
+            text += f'\nВаше место: {own[0]} из {total_users} ({own[1]} баллов)'
+        await update.message.reply_text(f'{text}\n\n{HELP_TEXT}')
+    else:
+        await update.message.reply_text(f'Нет данных о рейтингах.\n\n{HELP_TEXT}')
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(START_TEXT)
+
+async def test_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Сводка по своему тесту: /stats <название>"""
+    test_name = ' '.join(context.args)
+    if test_name not in test_store.by_creator(update.message.from_user.id):
+        await update.message.reply_text('Тест не найден или вы не являетесь его создателем. Используйте: /stats <название теста>')
+        return
+    stats = result_store.test_stats(test_store.get_id(test_name))
+    if stats is None:
+        await update.message.reply_text(f'Тест "{test_name}" еще никто не проходил.')
+        return
+    minutes, seconds = divmod(int(stats['average_duration']), 60)
+    await update.message.reply_text(
+        f'Тест "{test_name}":\nпопыток: {stats["attempts"]}, участников: {stats["users"]}\n'
+        f'лучший результат: {stats["best"]}/{stats["total"]}, средний: {stats["average"]:.1f}/{stats["total"]}\n'
+        f'среднее время: {minutes} мин {seconds} с')
+    cache = get_analytics()
+    if cache is not None:
+        import analytics  # уже загружен в get_analytics()
+        # Решаемость, дискриминация и выбор вариантов по каждому вопросу
+        test = test_store.get(test_name)
+        for text in analytics.report(test_name, test['questions'], cache.stats(test, stats['attempts']),
+                                     stats['total']):
+            await update.message.reply_text(text)
+
+def search_page(query: str, page: int):
+    """Текст и клавиатура страницы результатов поиска"""
+    index = get_search_index()
+    if index is None:
+        return 'Поисковый индекс еще загружается, попробуйте через несколько секунд.', None
+    total, found = index.search(query, page * SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE)
+    if not total:
+        return f'По запросу "{query}" ничего не найдено.', None
+    pages = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    if not found:  # результатов стало меньше, чем было при показе страницы
+        page = pages - 1
+        total, found = index.search(query, page * SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE)
+    return (f'Найдено тестов по запросу "{query}": {total} (страница {page + 1} из {pages})',
+            tests_keyboard(found, page, pages, 'search_page_'))
+
+async def search_tests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Поиск тестов по названию и тексту вопросов: /search <запрос>"""
+    query = ' '.join(context.args)
+    if not query:
+        await update.message.reply_text('Используйте: /search <часть названия или слова из вопросов>')
+        return
+    context.user_data['search_query'] = query
+    text, reply_markup = search_page(query, 0)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+async def shuffle_test(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Перемешивание и пул вопросов своего теста: /shuffle <название> [вопросов в попытке | off]"""
+    args = list(context.args)
+    user_tests = test_store.by_creator(update.message.from_user.id)
+    option = None
+    if ' '.join(args) not in user_tests and len(args) > 1 and (args[-1].isdigit() or args[-1].lower() == 'off'):
+        option = args.pop().lower()
+    test_name = ' '.join(args)
+    if test_name not in user_tests:
+        await update.message.reply_text('Тест не найден или вы не являетесь его создателем. '
+                                        'Используйте: /shuffle <название теста> [сколько вопросов выдавать | off]')
+        return
+    if option == 'off':
+        test_store.set_randomization(test_name, None, False)
+        await update.message.reply_text(f'Вопросы теста "{test_name}" снова выдаются все и по порядку.')
+        return
+    count = test_store.question_count(test_name)
+    pool_size = int(option) if option else None
+    if pool_size == 0:
+        await update.message.reply_text('Количество вопросов в попытке должно быть больше нуля.')
+        return
+    if pool_size is not None and pool_size >= count:
+        pool_size = None
+    test_store.set_randomization(test_name, pool_size, True)
+    text = f'Теперь в каждой попытке теста "{test_name}" вопросы и варианты ответов перемешиваются'
+    if pool_size:
+        text += f', выдается {pool_size} вопросов из {count}'
+    await update.message.reply_text(f'{text}.')
+
+async def delete_test(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.message.from_user.id
+    user_tests = test_store.by_creator(user_id)
+    
+    if not user_tests:
+        await update.message.reply_text('У вас нет тестов для удаления.')
+        return
+    
+    tests_list = '\n'.join(user_tests)
+    await update.message.reply_text(f'Ваши тесты:\n{tests_list}\nВведите название теста, который вы хотите удалить:')
+    context.user_data['deleting_test'] = True
+
+async def confirm_delete(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if context.user_data.get('deleting_test'):
+        test_name = update.message.text.strip()
+        test_id = test_store.get_id(test_name)
+        if test_store.delete(test_name, update.message.from_user.id):
+            keyboards.invalidate_test(test_name)
+            keyboards.invalidate_catalog()
+            if search_index is not None:
+                search_index.remove(test_id)
+            if test_analytics is not None:
+                test_analytics.invalidate(test_id)
+            await update.message.reply_text(f'Тест "{test_name}" был удален.\n\n{HELP_TEXT}')
+        else:
+            await update.message.reply_text('Тест не найден или вы не являетесь его создателем.')
+        context.user_data['deleting_test'] = False
+
+async def import_test(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Импорт теста из CSV или JSON: документ с подписью /import <название> [минуты]"""
+    args = (update.message.caption or '').split()[1:]
+    time_limit = int(args.pop()) if len(args) > 1 and args[-1].isdigit() else None
+    test_name = ' '.join(args)
+    if not test_name:
+        await update.message.reply_text('Отправьте файл CSV или JSON с подписью: /import <название теста> [время в минутах]')
+        return
+    if test_store.exists(test_name):
+        await update.message.reply_text(f'Тест "{test_name}" уже существует. Выберите другое название.')
+        return
+    document = update.message.document
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'import')
+        file = await document.get_file()
+        await file.download_to_drive(path)
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                # Первый проход проверяет весь файл, второй пишет вопросы одной транзакцией
+                fmt = bulk.detect_format(document.file_name, f)
+                count, errors = bulk.validate(f, fmt)
+                if not count and not errors:
+                    errors = ['Файл не содержит вопросов.']
+                if errors:
+                    await update.message.reply_text('Тест не импортирован:\n' + '\n'.join(errors))
+                    return
+                test_id = test_store.create(test_name, update.message.from_user.id, time_limit)
+                if test_id is None:
+                    await update.message.reply_text(f'Тест "{test_name}" уже существует. Выберите другое название.')
+                    return
+                test_store.add_questions(test_name, bulk.iter_questions(f, fmt))
+        except UnicodeDecodeError:
+            await update.message.reply_text('Тест не импортирован: файл должен быть в кодировке UTF-8.')
+            return
+    keyboards.invalidate_catalog()
+    if search_index is not None:
+        search_index.add(test_id, test_name, (question['text'] for question in test_store.iter_questions(test_name)))
+    await update.message.reply_text(f'Тест "{test_name}" импортирован, вопросов: {count}.')
+
+async def export_test(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Экспорт своего теста в файл: /export <название> [csv|json]"""
+    args = list(context.args)
+    fmt = args.pop().lower() if args and args[-1].lower() in ('csv', 'json') else 'json'
+    test_name = ' '.join(args)
+    if test_name not in test_store.by_creator(update.message.from_user.id):
+        await update.message.reply_text('Тест не найден или вы не являетесь его создателем.')
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'export.{fmt}')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            write = bulk.write_csv if fmt == 'csv' else bulk.write_json
+            write(f, test_store.iter_questions(test_name))
+        with open(path, 'rb') as f:
+            await update.message.reply_document(f, filename=f'{test_name}.{fmt}')
+
+def start_bot(application):
+    """Регистрирует обработчики команд в приложении"""
+    # Обработчик для команды /login без параметров
+    application.add_handler(CommandHandler("login", login))
+
+    # Обработчик для команды /login с параметром type
+    application.add_handler(CommandHandler("login", login_with_type))
+    # Обработчик команды /login
+    # Состояния диалогов сохраняются, только если у приложения есть persistence
+    persistent = application.persistence is not None
+    login_conv_handler = ConversationHandler(
+        name='login',
+        persistent=persistent,
+        entry_points=[CommandHandler('login', start_login_conversation)],
+        states={
+            ASK_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, ask_email)],  # Запрос почты
+            ASK_PASSWORD: [MessageHandler(filters.TEXT & ~filters.COMMAND, ask_password)],  # Запрос пароля
+        },
+        fallbacks=[CommandHandler('start', start)],
+    )
+    create_conv_handler = ConversationHandler(
+        name='create',
+        persistent=persistent,
+        entry_points=[CommandHandler('create', create)],
+        states={
+            CREATE_TEST: [MessageHandler(filters.TEXT & ~filters.COMMAND, create_test)],
+            SET_TIME_LIMIT: [MessageHandler(filters.TEXT & ~filters.COMMAND, set_time_limit)],
+            ADD_QUESTION_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_question_text)],
+            ADD_ANSWERS: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_answers)],
+            SELECT_CORRECT_ANSWER: [CallbackQueryHandler(select_correct_answer)],
+            FINISH_CREATION: [CallbackQueryHandler(finish_creation)],
+            TESTS_TEST: [CallbackQueryHandler(button)],
+            ASK_QUESTION: [CallbackQueryHandler(button)],
+            CHECK_ANSWER: [CallbackQueryHandler(check_answer)],
+        },
+        fallbacks=[CommandHandler('start', start)],
+    )
+
+    application.add_handler(login_conv_handler)
+    application.add_handler(create_conv_handler)
+    application.add_handler(CommandHandler('list', list_tests))
+    application.add_handler(CommandHandler('tests', tests))
+    application.add_handler(CommandHandler('search', search_tests))
+    application.add_handler(CommandHandler('start', start))
+    application.add_handler(CommandHandler('view_results', view_results))
+    application.add_handler(CallbackQueryHandler(button))
+    application.add_handler(CommandHandler('list_rankings', list_rankings))
+    application.add_handler(CommandHandler('stats', test_stats))
+    application.add_handler(CommandHandler('shuffle', shuffle_test))
+    application.add_handler(CommandHandler('delete', delete_test))
+    application.add_handler(MessageHandler(filters.Document.ALL & filters.CaptionRegex(r'^/import\b'), import_test))
+    application.add_handler(CommandHandler('export', export_test))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, confirm_delete))
+    # Число вызовов, время и ошибки каждого обработчика - на /metrics
+    metrics.instrument_application(application)
@@ -0,0 +1,99 @@
+import os
+from collections import OrderedDict
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import callbacks
+
+# Кэш готовых inline-клавиатур.
+# Клавиатура вопроса собирается при первом показе этого вопроса (большой тест целиком
+# не собирается), страницы списка тестов - при первом запросе. Клавиатуры теста
+# сбрасываются при изменении его вопросов, страницы списка - только при создании и
+# удалении теста, поэтому обработчики не пересобирают разметку на каждое обновление.
+
+TESTS_PAGE_SIZE = int(os.getenv('TESTS_PAGE_SIZE', '10'))
+KEYBOARD_CACHE_SIZE = int(os.getenv('KEYBOARD_CACHE_SIZE', '10000'))  # сколько клавиатур вопросов держать в кэше
+
+
+class KeyboardCache:
+    """Кэш клавиатур вопросов (LRU по вопросам) и страниц списка тестов"""
+
+    def __init__(self, store, page_size: int = TESTS_PAGE_SIZE, max_questions: int = KEYBOARD_CACHE_SIZE):
+        self._store = store
+        self._page_size = page_size
+        self._max_questions = max_questions
+        self._questions = OrderedDict()  # (имя теста, номер вопроса) -> (текст вопроса, клавиатура)
+        self._by_test = {}               # имя теста -> номера вопросов в кэше, для сброса
+        self._catalog = None             # снимок списка (id, имя) тестов для страниц
+        self._pages = {}                 # номер страницы -> клавиатура
+
+    def _compile(self, test_name: str, index: int):
+        question = self._store.get_question(test_name, index)
+        if question is None:
+            raise IndexError(f'В тесте {test_name!r} нет вопроса {index}')
+        test_id = self._store.get_id(test_name)
+        return question['text'], InlineKeyboardMarkup(
+            [[InlineKeyboardButton(answer, callback_data=callbacks.encode_answer(test_id, index, option))]
+             for option, answer in enumerate(question['answers'])])
+
+    def question(self, test_name: str, index: int):
+        """Возвращает (текст вопроса, клавиатура); при промахе собирает только этот вопрос"""
+        key = (test_name, index)
+        compiled = self._questions.get(key)
+        if compiled is not None:
+            self._questions.move_to_end(key)
+            return compiled
+        compiled = self._questions[key] = self._compile(test_name, index)
+        self._by_test.setdefault(test_name, set()).add(index)
+        if len(self._questions) > self._max_questions:
+            (old_name, old_index), _ = self._questions.popitem(last=False)
+            indexes = self._by_test[old_name]
+            indexes.discard(old_index)
+            if not indexes:
+                del self._by_test[old_name]
+        return compiled
+
+    def invalidate_test(self, test_name: str) -> None:
+        """Сбрасывает клавиатуры вопросов теста после изменения; список тестов остается"""
+        for index in self._by_test.pop(test_name, ()):
+            del self._questions[test_name, index]
+
+    def invalidate_catalog(self) -> None:
+        """Сбрасывает страницы списка тестов - только когда тест создан или удален"""
+        self._catalog = None
+        self._pages.clear()
+
+    def pages(self) -> int:
+        if self._catalog is None:
+            self._catalog = self._store.catalog()
+        return max(1, (len(self._catalog) + self._page_size - 1) // self._page_size)
+
+    def tests_page(self, page: int) -> InlineKeyboardMarkup:
+        """Клавиатура страницы списка тестов с кнопками навигации"""
+        markup = self._pages.get(page)
+        if markup is not None:
+            return markup
+        pages = self.pages()
+        start = page * self._page_size
+        markup = self._pages[page] = tests_keyboard(self._catalog[start:start + self._page_size], page, pages,
+                                                    'tests_page_')
+        return markup
+
+
+def tests_keyboard(tests, page: int, pages: int, prefix: str) -> InlineKeyboardMarkup:
+    """Кнопки тестов [(id, имя)] одной страницы и навигация с callback_data prefix + номер страницы"""
+    keyboard = [[InlineKeyboardButton(name, callback_data=callbacks.encode_test(test_id))] for test_id, name in tests]
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton('◀', callback_data=f'{prefix}{page - 1}'))
+    if page + 1 < pages:
+        navigation.append(InlineKeyboardButton('▶', callback_data=f'{prefix}{page + 1}'))
+    if navigation:
+        keyboard.append(navigation)
+    return InlineKeyboardMarkup(keyboard)
+
+
+def answers_keyboard(test_id: int, index: int, answers: list, order: bytes) -> InlineKeyboardMarkup:
+    """Клавиатура вопроса с вариантами в порядке order; в кнопке - номер показанного варианта"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(answers[option], callback_data=callbacks.encode_answer(
+        test_id, index, shown))] for shown, option in enumerate(order)])
@@ -0,0 +1,210 @@
+import os
+from itertools import islice
+
+# Рейтинг участников, который обновляется инкрементально при каждом новом результате.
+# Ключ - Telegram user id, сумма лучших результатов по всем тестам хранится готовой,
+# поэтому /list_rankings не пересчитывает и не сортирует всех пользователей.
+# Лучший результат по каждой паре (пользователь, тест) рейтинг хранит сам, рядом с суммами:
+# прирост суммы не зависит от журнала попыток, который может лежать в другом хранилище
+# (или быть общим для нескольких реплик) и пережить рейтинг или не пережить его.
+
+
+class Leaderboard:
+    """Рейтинг в памяти процесса.
+
+    Дерево Фенвика по значению суммы баллов хранит число пользователей с каждым счетом:
+    место пользователя и начало любой страницы находятся за O(log S), где S - максимальный счет.
+    """
+
+    def __init__(self, size: int = 1024):
+        self._totals = {}   # user id -> сумма баллов
+        self._names = {}    # user id -> отображаемое имя
+        self._best = {}     # (user id, test id) -> лучший результат
+        self._buckets = {}  # счет -> {user id: None} в порядке достижения счета
+        self._tree = [0] * (size + 1)
+
+    async def count(self) -> int:
+        """Число пользователей в рейтинге"""
+        return len(self._totals)
+
+    def _grow(self, score):
+        size = len(self._tree) - 1
+        while score >= size:
+            size *= 2
+        counts = [0] * (size + 1)
+        for bucket_score, users in self._buckets.items():
+            counts[bucket_score + 1] = len(users)
+        # Построение дерева Фенвика за O(size)
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                counts[parent] += counts[i]
+        self._tree = counts
+
+    def _update(self, score, delta):
+        i = score + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _count_le(self, score):
+        """Число пользователей со счетом не больше score"""
+        i = min(score + 1, len(self._tree) - 1)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _kth(self, k):
+        """Счет k-го по возрастанию пользователя (k >= 1)"""
+        pos = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(self._tree) and self._tree[nxt] < k:
+                pos = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return pos
+
+    async def record(self, user_id: int, name: str, test_id: int, score: int) -> None:
+        """Учитывает результат попытки: в сумму входит только лучший результат по тесту"""
+        previous = self._best.get((user_id, test_id))
+        if previous is not None and score <= previous:
+            return
+        self._best[user_id, test_id] = score
+        self._add(user_id, name, score - (previous or 0))
+
+    def load(self, bests) -> None:
+        """Восстанавливает рейтинг из лучших результатов (user id, имя, test id, результат)"""
+        for user_id, name, test_id, score in bests:
+            previous = self._best.get((user_id, test_id))
+            if previous is None or score > previous:
+                self._best[user_id, test_id] = score
+                self._add(user_id, name, score - (previous or 0))
+
+    async def add(self, user_id: int, name: str, delta: int) -> None:
+        """Прибавляет delta к сумме баллов пользователя"""
+        self._add(user_id, name, delta)
+
+    def _add(self, user_id, name, delta):
+        self._names[user_id] = name
+        old = self._totals.get(user_id)
+        new = max((old or 0) + delta, 0)
+        if old == new:
+            return
+        if old is not None:
+            bucket = self._buckets[old]
+            del bucket[user_id]
+            if not bucket:
+                del self._buckets[old]
+            self._update(old, -1)
+        if new >= len(self._tree) - 1:
+            self._grow(new)
+        self._totals[user_id] = new
+        self._buckets.setdefault(new, {})[user_id] = None
+        self._update(new, 1)
+
+    async def rank(self, user_id: int):
+        """Возвращает (место, сумма баллов) или None, если у пользователя нет результатов"""
+        total = self._totals.get(user_id)
+        if total is None:
+            return None
+        return len(self._totals) - self._count_le(total) + 1, total
+
+    async def page(self, offset: int, limit: int) -> list:
+        """Срез рейтинга: список (место, имя, сумма баллов) начиная с позиции offset"""
+        count = len(self._totals)
+        result = []
+        if offset >= count:
+            return result
+        # Счет пользователя на позиции offset (по убыванию) и сколько его соседей по счету пропустить
+        score = self._kth(count - offset)
+        higher = count - self._count_le(score)
+        skip = offset - higher
+        while len(result) < limit:
+            bucket = self._buckets[score]
+            for user_id in islice(bucket, skip, skip + limit - len(result)):
+                result.append((higher + 1, self._names[user_id], score))
+            higher += len(bucket)
+            if higher >= count:
+                break
+            score = self._kth(count - higher)
+            skip = 0
+        return result
+
+
+class RedisLeaderboard:
+    """Рейтинг в отсортированном множестве Redis: общий для всех реплик бота"""
+
+    def __init__(self, redis, key: str = 'leaderboard'):
+        self._redis = redis
+        self._key = key
+        self._names_key = f'{key}:names'
+
+    async def count(self):
+        return await self._redis.zcard(self._key)
+
+    async def record(self, user_id, name, test_id, score):
+        from redis.exceptions import WatchError
+
+        # Лучшие результаты пользователя - отдельный хеш на пользователя: WATCH на нем
+        # конфликтует только с попытками того же пользователя
+        best_key = f'{self._key}:best:{user_id}'
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(best_key)
+                    previous = await pipe.hget(best_key, test_id)
+                    previous = int(previous) if previous is not None else None
+                    if previous is not None and score <= previous:
+                        return
+                    pipe.multi()
+                    pipe.hset(best_key, test_id, score)
+                    pipe.zincrby(self._key, score - (previous or 0), user_id)
+                    pipe.hset(self._names_key, user_id, name)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue  # другая реплика успела записать результат - перечитываем
+
+    async def add(self, user_id, name, delta):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zincrby(self._key, delta, user_id)
+            pipe.hset(self._names_key, user_id, name)
+            await pipe.execute()
+
+    async def rank(self, user_id):
+        total = await self._redis.zscore(self._key, user_id)
+        if total is None:
+            return None
+        higher = await self._redis.zcount(self._key, f'({total}', '+inf')
+        return higher + 1, int(total)
+
+    async def page(self, offset, limit):
+        entries = await self._redis.zrevrange(self._key, offset, offset + limit - 1, withscores=True)
+        if not entries:
+            return []
+        names = await self._redis.hmget(self._names_key, [user_id for user_id, _ in entries])
+        # Место первого на странице, дальше считаем сами с учетом равных счетов
+        first_total = entries[0][1]
+        place = await self._redis.zcount(self._key, f'({first_total}', '+inf') + 1
+        result = []
+        for position, ((_, total), name) in enumerate(zip(entries, names)):
+            if total != first_total:
+                place, first_total = offset + position + 1, total
+            result.append((place, name.decode() if name else '?', int(total)))
+        return result
+
+
+def create_leaderboard(url: str = None):
+    """Создает рейтинг: 'memory' (по умолчанию) или 'redis'"""
+    url = url or os.getenv('LEADERBOARD', 'memory')
+    if url == 'memory':
+        return Leaderboard()
+    if url == 'redis':
+        import auth_client
+        return RedisLeaderboard(auth_client.get_redis())
+    raise ValueError(f'Неизвестный тип рейтинга: {url}')
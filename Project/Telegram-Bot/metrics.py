@@ -0,0 +1,155 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from telegram.ext import ApplicationHandlerStop, ConversationHandler
+
+# Метрики бота в текстовом формате Prometheus.
+# Счетчики и гистограммы хранятся в памяти процесса и отдаются целиком по /metrics;
+# обновление метрики - пара операций со словарем, без блокировок (все в одном event loop).
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_metrics = {}  # имя -> метрика, в порядке регистрации
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _metrics[name] = self
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in self._values.items():
+            yield f'{self.name}{_labels(self.labelnames, labels)} {value}'
+
+
+class Histogram:
+    """Распределение длительностей по корзинам с метками"""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # метки -> [число попаданий по корзинам (последняя - +Inf), сумма]
+        _metrics[name] = self
+
+    def observe(self, value: float, *labels) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        names = self.labelnames + ('le',)
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {total}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}'
+
+
+class Gauge:
+    """Значение, которое считывается функцией в момент запроса /metrics.
+
+    kind='counter' - для счетчиков, которые уже ведет другой объект (например, конвейер).
+    """
+
+    def __init__(self, name: str, documentation: str, read, kind: str = 'gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+        _metrics[name] = self  # повторная регистрация заменяет прежнюю функцию
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+        yield f'{self.name} {self.read()}'
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    return '\n'.join(line for metric in _metrics.values() for line in metric.render()) + '\n'
+
+
+HANDLER_CALLS = Counter('bot_handler_calls_total', 'Вызовы обработчиков', ('handler',))
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Исключения в обработчиках', ('handler',))
+HANDLER_SECONDS = Histogram('bot_handler_seconds', 'Время работы обработчиков', ('handler',))
+REDIS_SECONDS = Histogram('bot_redis_seconds', 'Время команд Redis', ('command',))
+AUTH_SECONDS = Histogram('bot_auth_request_seconds', 'Время запросов к модулю авторизации', ('status',))
+UPDATE_SECONDS = Histogram('bot_update_seconds', 'Время от приема обновления конвейером до конца обработки')
+
+
+def instrument(callback):
+    """Оборачивает корутину-обработчик: число вызовов, время и ошибки по имени функции"""
+    name = callback.__name__
+
+    @wraps(callback)
+    async def wrapper(update, context):
+        HANDLER_CALLS.inc(name)
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _instrument_handler(handler):
+    if isinstance(handler, ConversationHandler):
+        for inner in handler.entry_points + handler.fallbacks:
+            _instrument_handler(inner)
+        for handlers in handler.states.values():
+            for inner in handlers:
+                _instrument_handler(inner)
+    elif not getattr(handler.callback, 'instrumented', False):
+        handler.callback = instrument(handler.callback)
+
+
+def instrument_application(application) -> None:
+    """Подключает метрики ко всем уже зарегистрированным обработчикам, включая состояния диалогов"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import pickle
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+# Хранение состояния диалогов и user_data в Redis.
+# Application сам собирает изменившиеся данные раз в update_interval секунд;
+# здесь все изменения одного такого прохода складываются в буфер и уходят
+# в Redis одним pipeline, а не отдельной командой на каждого пользователя.
+# Вместе с user_data хранится номер его версии: перечитывание перед обновлением
+# заменяет данные в памяти, только если в Redis их записала другая реплика.
+
+logger = logging.getLogger(__name__)
+
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '5'))
+# Перечитывать user_data из Redis перед каждым обновлением (нужно, если обновления
+# одного пользователя могут попасть на разные реплики бота)
+PERSISTENCE_REFRESH = os.getenv('PERSISTENCE_REFRESH', '0') == '1'
+
+
+class RedisPersistence(BasePersistence):
+    """Persistence для Application на Redis-хешах.
+
+    user_data лежит в хеше <prefix>:user_data (поле - user id), номера версий - в
+    <prefix>:user_data_version, состояния диалогов - в хешах <prefix>:conversations:<имя
+    диалога>. Значения сериализуются pickle.
+    """
+
+    def __init__(self, redis, prefix: str = 'bot', update_interval: float = PERSISTENCE_FLUSH_INTERVAL,
+                 refresh: bool = PERSISTENCE_REFRESH):
+        # chat_data, bot_data и callback_data бот не использует - не тратим на них запись
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+                         update_interval=update_interval)
+        self._redis = redis
+        self._prefix = prefix
+        self._refresh = refresh
+        self._pending = {}  # (ключ Redis, поле) -> сериализованное значение или None для удаления
+        self._versions = {}  # user id -> версия user_data, которую эта реплика записала или прочитала
+        self._write_lock = asyncio.Lock()  # pipeline идут по очереди, чтобы поздняя запись не обогнала раннюю
+        self._flush_task = None
+
+    def _key(self, *parts):
+        return ':'.join((self._prefix,) + parts)
+
+    def _stage(self, key, field, value):
+        self._pending[(key, field)] = None if value is None else pickle.dumps(value)
+        # Все update_* одного прохода Application вызываются подряд - пишем их вместе
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._write())
+            self._flush_task.add_done_callback(self._write_done)
+
+    @staticmethod
+    def _write_done(task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            # Изменения вернулись в буфер и уйдут со следующей записью
+            logger.error('Не удалось записать состояние в Redis', exc_info=task.exception())
+
+    async def flush(self) -> None:
+        """Записывает все накопленные изменения, дождавшись уже начатой записи"""
+        await self._write()
+
+    async def _write(self) -> None:
+        """Записывает накопленные изменения одним pipeline"""
+        await asyncio.sleep(0)
+        async with self._write_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            user_data = self._key('user_data')
+            versions = self._key('user_data_version')
+            bumped = {}  # номер ответа hincrby в pipeline -> user id
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for (key, field), value in pending.items():
+                        if value is None:
+                            pipe.hdel(key, field)
+                            if key == user_data:
+                                pipe.hdel(versions, field)
+                                self._versions.pop(field, None)
+                        else:
+                            pipe.hset(key, field, value)
+                            if key == user_data:
+                                bumped[len(pipe)] = field
+                                pipe.hincrby(versions, field, 1)
+                    replies = await pipe.execute()
+            except Exception:
+                for item, value in pending.items():
+                    self._pending.setdefault(item, value)  # более новое значение из буфера не затираем
+                raise
+            for index, field in bumped.items():
+                self._versions[field] = replies[index]
+
+    async def get_user_data(self):
+        data = await self._redis.hgetall(self._key('user_data'))
+        versions = await self._redis.hgetall(self._key('user_data_version'))
+        self._versions = {int(user_id): int(version) for user_id, version in versions.items()}
+        return {int(user_id): pickle.loads(value) for user_id, value in data.items()}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        data = await self._redis.hgetall(self._key('conversations', name))
+        return {pickle.loads(key): pickle.loads(state) for key, state in data.items()}
+
+    async def update_conversation(self, name, key, new_state) -> None:
+        self._stage(self._key('conversations', name), pickle.dumps(key), new_state)
+
+    async def update_user_data(self, user_id, data) -> None:
+        self._stage(self._key('user_data'), user_id, data)
+
+    async def drop_user_data(self, user_id) -> None:
+        self._stage(self._key('user_data'), user_id, None)
+
+    async def refresh_user_data(self, user_id, user_data) -> None:
+        if not self._refresh:
+            return
+        async with self._write_lock:  # версия своей записи должна быть уже известна
+            version = await self._redis.hget(self._key('user_data_version'), user_id)
+            if version is None or int(version) <= self._versions.get(user_id, 0):
+                # В Redis наша же запись или более старая - в памяти данные не хуже
+                return
+            value = await self._redis.hget(self._key('user_data'), user_id)
+            self._versions[user_id] = int(version)
+        if value is not None:
+            user_data.clear()
+            user_data.update(pickle.loads(value))
+
+    async def update_chat_data(self, chat_id, data) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
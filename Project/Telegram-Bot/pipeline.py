@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+import metrics
+
+# Конвейер обработки входящих обновлений.
+# Обновления раскладываются по ограниченным очередям по chat id, каждую очередь
+# разбирает свой обработчик: сообщения одного чата обрабатываются строго по порядку,
+# разные чаты - параллельно. Когда очередь заполнена, срабатывает политика сброса нагрузки.
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', '8'))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '1000'))
+# drop_new - отбросить новое обновление, drop_oldest - вытеснить самое старое в очереди,
+# reject - отказать (вебхук ответит 503 и Telegram повторит доставку позже)
+PIPELINE_POLICY = os.getenv('PIPELINE_POLICY', 'drop_new')
+PIPELINE_STATS_INTERVAL = float(os.getenv('PIPELINE_STATS_INTERVAL', '60'))
+
+POLICIES = ('drop_new', 'drop_oldest', 'reject')
+
+
+class PipelineMetrics:
+    """Счетчики конвейера и задержки последних обработанных обновлений"""
+
+    def __init__(self, window: int = 10000):
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.latencies = deque(maxlen=window)  # секунды от приема до конца обработки
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        samples = sorted(self.latencies)
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+class UpdatePipeline:
+    """Ограниченная очередь обновлений с пулом обработчиков"""
+
+    def __init__(self, process, workers: int = PIPELINE_WORKERS, max_size: int = PIPELINE_QUEUE_SIZE,
+                 policy: str = PIPELINE_POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f'Неизвестная политика сброса нагрузки: {policy}')
+        self._process = process
+        self._policy = policy
+        # Общий размер делится между очередями обработчиков
+        self._queues = [asyncio.Queue(maxsize=max(1, max_size // workers)) for _ in range(workers)]
+        self._tasks = []
+        self.metrics = PipelineMetrics()
+
+    @property
+    def rejects(self) -> bool:
+        """Отказывать ли в приеме при переполнении вместо молчаливого сброса"""
+        return self._policy == 'reject'
+
+    def depth(self) -> int:
+        """Сколько обновлений ждет обработки"""
+        return sum(queue.qsize() for queue in self._queues)
+
+    @staticmethod
+    def _key(update):
+        chat = getattr(update, 'effective_chat', None)
+        if chat is not None:
+            return chat.id
+        user = getattr(update, 'effective_user', None)
+        return user.id if user is not None else getattr(update, 'update_id', 0)
+
+    def submit(self, update) -> bool:
+        """Ставит обновление в очередь не дожидаясь обработки. False - обновление не принято"""
+        self.metrics.received += 1
+        queue = self._queues[hash(self._key(update)) % len(self._queues)]
+        if queue.full():
+            self.metrics.dropped += 1
+            if self._policy != 'drop_oldest':
+                return False
+            queue.get_nowait()
+            queue.task_done()
+        queue.put_nowait((time.monotonic(), update))
+        return True
+
+    async def _worker(self, queue):
+        while True:
+            received_at, update = await queue.get()
+            try:
+                await self._process(update)
+                self.metrics.processed += 1
+            except Exception as e:
+                self.metrics.failed += 1
+                logger.error(f"Ошибка при обработке обновления: {e}")
+            finally:
+                latency = time.monotonic() - received_at
+                self.metrics.latencies.append(latency)
+                metrics.UPDATE_SECONDS.observe(latency)
+                queue.task_done()
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(PIPELINE_STATS_INTERVAL)
+            m = self.metrics
+            logger.info(f"Конвейер: в очереди {self.depth()}, обработано {m.processed}, ошибок {m.failed}, "
+                        f"сброшено {m.dropped}, p50 {m.percentile(0.5) * 1000:.1f} мс, "
+                        f"p99 {m.percentile(0.99) * 1000:.1f} мс")
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+        if PIPELINE_STATS_INTERVAL > 0:
+            self._tasks.append(asyncio.create_task(self._report()))
+
+    async def stop(self, drain: bool = True) -> None:
+        """Останавливает обработчики, по умолчанию дождавшись разбора очередей"""
+        if drain:
+            await asyncio.gather(*(queue.join() for queue in self._queues))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Ограничение частоты исходящих сообщений бота.
+# Telegram допускает около 30 сообщений в секунду на бота и около одного в секунду
+# в один чат (в группу - 20 в минуту); при превышении отвечает 429 с retry_after.
+# Каждый чат получает свое ведро токенов, все чаты вместе - общее. Сообщения одного
+# чата уходят строго по очереди, а простые текстовые сообщения, которые ждут очереди
+# в один и тот же чат, склеиваются в одно.
+
+logger = logging.getLogger(__name__)
+
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', '30'))
+SEND_GLOBAL_BURST = float(os.getenv('SEND_GLOBAL_BURST', '10'))
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', '1'))
+SEND_CHAT_BURST = float(os.getenv('SEND_CHAT_BURST', '3'))
+SEND_GROUP_RATE = float(os.getenv('SEND_GROUP_RATE', str(20 / 60)))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+
+MAX_MESSAGE_LENGTH = 4096
+MERGE_SEPARATOR = '\n\n'
+# Методы, на которые действуют лимиты Telegram; остальные (answerCallbackQuery, getFile,
+# setWebhook...) идут без очереди, но с обработкой retry_after
+THROTTLED_PREFIXES = ('send', 'copyMessage', 'forwardMessage')
+# Склеиваем только сообщения без клавиатуры, разметки и ответа на сообщение
+MERGEABLE_FIELDS = {'chat_id', 'text'}
+IDLE_CHATS_LIMIT = 10000
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько секунд ждать следующего токена (0 - можно отправлять)"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and self.blocked_until <= self.updated
+
+    async def take(self) -> None:
+        while (delay := self.delay()) > 0:
+            await asyncio.sleep(delay)
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """Ответ 429: до конца retry_after ничего не отправляем"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _Chat:
+    __slots__ = ('bucket', 'lock', 'batch')
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.lock = asyncio.Lock()  # очередь отправок в чат, сохраняет порядок сообщений
+        self.batch = None           # склейка, которая еще ждет своей очереди
+
+
+class _Batch:
+    __slots__ = ('texts', 'length', 'future')
+
+    def __init__(self, text):
+        self.texts = [text]
+        self.length = len(text)
+        self.future = asyncio.get_running_loop().create_future()
+
+    def add(self, text) -> bool:
+        length = self.length + len(MERGE_SEPARATOR) + len(text)
+        if length > MAX_MESSAGE_LENGTH:
+            return False
+        self.texts.append(text)
+        self.length = length
+        return True
+
+
+class ChatRateLimiter(BaseRateLimiter):
+    """Rate limiter для Application: ведро на чат, общее ведро на бота и склейка сообщений"""
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, global_burst: float = SEND_GLOBAL_BURST,
+                 chat_rate: float = SEND_CHAT_RATE, chat_burst: float = SEND_CHAT_BURST,
+                 group_rate: float = SEND_GROUP_RATE, max_retries: int = SEND_MAX_RETRIES):
+        self._global = TokenBucket(global_rate, global_burst)
+        self._global_lock = asyncio.Lock()  # ожидающие общего токена встают в одну очередь
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._group_rate = group_rate
+        self._max_retries = max_retries
+        self._chats = {}
+        self.merged = 0     # сообщений, ушедших в составе склейки
+        self.retried = 0    # повторов после 429
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= IDLE_CHATS_LIMIT:
+                self._forget_idle_chats()
+            # Отрицательный id - группа или канал, у них свой, более строгий лимит
+            rate = self._group_rate if isinstance(chat_id, str) or chat_id < 0 else self._chat_rate
+            chat = self._chats[chat_id] = _Chat(TokenBucket(rate, self._chat_burst))
+        return chat
+
+    def _forget_idle_chats(self):
+        # Полное ведро без очереди ничем не отличается от нового - его можно не хранить
+        for chat_id in [chat_id for chat_id, chat in self._chats.items()
+                        if not chat.lock.locked() and chat.bucket.is_full()]:
+            del self._chats[chat_id]
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None or not endpoint.startswith(THROTTLED_PREFIXES):
+            return await self._call(None, callback, args, kwargs)
+        chat = self._chat(chat_id)
+        batch = None
+        if endpoint == 'sendMessage' and data.keys() <= MERGEABLE_FIELDS:
+            if chat.batch is not None and chat.batch.add(data['text']):
+                # Предыдущее сообщение в этот чат еще ждет очереди - уходим вместе с ним
+                self.merged += 1
+                return await asyncio.shield(chat.batch.future)
+            batch = chat.batch = _Batch(data['text'])
+        else:
+            chat.batch = None  # следующие сообщения не должны обогнать это
+        async with chat.lock:
+            await chat.bucket.take()
+            async with self._global_lock:
+                await self._global.take()
+            if batch is not None:
+                if chat.batch is batch:
+                    chat.batch = None
+                data['text'] = MERGE_SEPARATOR.join(batch.texts)
+            try:
+                result = await self._call(chat.bucket, callback, args, kwargs)
+            except Exception as e:
+                if batch is not None and len(batch.texts) > 1:
+                    batch.future.set_exception(e)
+                raise
+            if batch is not None:
+                batch.future.set_result(result)
+            return result
+
+    async def _call(self, bucket, callback, args, kwargs):
+        for attempt in range(self._max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self._max_retries:
+                    raise
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after
+                logger.warning(f"Превышен лимит Telegram, повтор через {seconds} с")
+                self.retried += 1
+                # 429 в чат останавливает только этот чат, прочие запросы - всего бота
+                (bucket or self._global).block(seconds + 0.1)
+                await asyncio.sleep(seconds + 0.1)
@@ -0,0 +1,249 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+# Журнал попыток прохождения тестов.
+# Каждая попытка дописывается в журнал и не меняется: время начала и конца, набранные
+# баллы, выбранный вариант и верность ответа на каждый вопрос (по байту на вопрос).
+# Вместе с записью в той же транзакции обновляются сводки по пользователю и по тесту
+# (попытки, лучший и средний результат), поэтому /view_results и /stats читают
+# готовые строки, а не пересчитывают журнал.
+#
+# Попытка - словарь {'user_id', 'user_name', 'test_id', 'test_name', 'started', 'finished',
+# 'score', 'total', 'choices', 'marks'}, где choices - bytes с номерами выбранных
+# вариантов, marks - bytes из 1 (верно) и 0 (неверно) для отвеченных вопросов.
+# Оба массива идут по номерам вопросов теста; если тест выдает вопросы из пула,
+# у незаданных вопросов стоит 0xff.
+
+
+class ResultStore:
+    """Базовый интерфейс журнала попыток"""
+
+    def record(self, attempt: dict):
+        """Дописывает попытку и обновляет сводки. Возвращает прежний лучший результат
+        пользователя по этому тесту или None, если это первая попытка"""
+        raise NotImplementedError
+
+    def user_results(self, user_id: int) -> list:
+        """Сводки пользователя по тестам в порядке первой попытки: словари
+        {'test_id', 'test_name', 'attempts', 'best', 'average', 'last', 'total'}"""
+        raise NotImplementedError
+
+    def test_stats(self, test_id: int):
+        """Сводка по тесту {'test_name', 'attempts', 'users', 'best', 'average',
+        'average_duration', 'total'} или None, если попыток не было"""
+        raise NotImplementedError
+
+    def iter_attempts(self, test_id: int):
+        """Попытки теста по одной в порядке записи"""
+        raise NotImplementedError
+
+    def iter_choices(self, test_id: int):
+        """Только выбранные варианты (bytes) попыток теста в порядке записи - для аналитики"""
+        raise NotImplementedError
+
+    def last_test_id(self) -> int:
+        """Наибольший id теста, по которому есть попытки, или 0"""
+        raise NotImplementedError
+
+    def iter_bests(self):
+        """Лучшие результаты (user id, имя, test id, лучший результат) - для восстановления рейтинга"""
+        raise NotImplementedError
+
+
+def _user_summary(row: dict) -> dict:
+    return {'test_id': row['test_id'], 'test_name': row['test_name'], 'attempts': row['attempts'],
+            'best': row['best'], 'average': row['score_sum'] / row['attempts'], 'last': row['last'],
+            'total': row['total']}
+
+
+def _test_summary(row: dict) -> dict:
+    return {'test_name': row['test_name'], 'attempts': row['attempts'], 'users': row['users'],
+            'best': row['best'], 'average': row['score_sum'] / row['attempts'],
+            'average_duration': row['duration_sum'] / row['attempts'], 'total': row['total']}
+
+
+class MemoryResultStore(ResultStore):
+    """Журнал в памяти процесса"""
+
+    def __init__(self):
+        self._attempts = {}  # test id -> [попытка]
+        self._users = {}     # user id -> {test id: сводка}
+        self._tests = {}     # test id -> сводка
+
+    def record(self, attempt):
+        attempt = dict(attempt, choices=bytes(attempt['choices']), marks=bytes(attempt['marks']))
+        score, duration = attempt['score'], attempt['finished'] - attempt['started']
+        self._attempts.setdefault(attempt['test_id'], []).append(attempt)
+
+        user_tests = self._users.setdefault(attempt['user_id'], {})
+        user = user_tests.get(attempt['test_id'])
+        previous = user['best'] if user else None
+        if user is None:
+            user = user_tests[attempt['test_id']] = {'test_id': attempt['test_id'], 'attempts': 0,
+                                                     'best': score, 'score_sum': 0}
+        user.update(user_name=attempt.get('user_name', ''), test_name=attempt['test_name'], attempts=user['attempts'] + 1, best=max(user['best'], score),
+                    score_sum=user['score_sum'] + score, last=score, total=attempt['total'])
+
+        test = self._tests.get(attempt['test_id'])
+        if test is None:
+            test = self._tests[attempt['test_id']] = {'attempts': 0, 'users': 0, 'best': score,
+                                                      'score_sum': 0, 'duration_sum': 0.0}
+        test.update(test_name=attempt['test_name'], attempts=test['attempts'] + 1,
+                    users=test['users'] + (previous is None), best=max(test['best'], score),
+                    score_sum=test['score_sum'] + score, duration_sum=test['duration_sum'] + duration,
+                    total=attempt['total'])
+        return previous
+
+    def user_results(self, user_id):
+        return [_user_summary(row) for row in self._users.get(user_id, {}).values()]
+
+    def test_stats(self, test_id):
+        row = self._tests.get(test_id)
+        return _test_summary(row) if row else None
+
+    def iter_attempts(self, test_id):
+        return iter(self._attempts.get(test_id, ()))
+
+    def iter_choices(self, test_id):
+        return (attempt['choices'] for attempt in self._attempts.get(test_id, ()))
+
+    def last_test_id(self):
+        return max(self._attempts, default=0)
+
+    def iter_bests(self):
+        for user_id, user_tests in self._users.items():
+            for test_id, row in user_tests.items():
+                yield user_id, row['user_name'], test_id, row['best']
+
+
+class SQLiteResultStore(ResultStore):
+    """Журнал в SQLite: история попыток переживает перезапуск бота"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS attempts (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            test_id INTEGER NOT NULL,
+            test_name TEXT NOT NULL,
+            started REAL NOT NULL,
+            finished REAL NOT NULL,
+            score INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            choices BLOB NOT NULL,
+            marks BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS attempts_test ON attempts (test_id);
+        CREATE TABLE IF NOT EXISTS user_results (
+            user_id INTEGER NOT NULL,
+            test_id INTEGER NOT NULL,
+            test_name TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            best INTEGER NOT NULL,
+            score_sum INTEGER NOT NULL,
+            last INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            first_attempt INTEGER NOT NULL,
+            user_name TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (user_id, test_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS test_results (
+            test_id INTEGER PRIMARY KEY,
+            test_name TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            users INTEGER NOT NULL,
+            best INTEGER NOT NULL,
+            score_sum INTEGER NOT NULL,
+            duration_sum REAL NOT NULL,
+            total INTEGER NOT NULL
+        );
+    """
+    USER_COLUMNS = ('test_id', 'test_name', 'attempts', 'best', 'score_sum', 'last', 'total')
+    TEST_COLUMNS = ('test_name', 'attempts', 'users', 'best', 'score_sum', 'duration_sum', 'total')
+    ATTEMPT_COLUMNS = ('user_id', 'test_id', 'test_name', 'started', 'finished', 'score', 'total', 'choices', 'marks')
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(user_results)')}
+        if 'user_name' not in columns:
+            # Журналы, созданные до хранения имен: имя появится со следующей попыткой
+            self._conn.execute("ALTER TABLE user_results ADD COLUMN user_name TEXT NOT NULL DEFAULT ''")
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, при исключении - ROLLBACK"""
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def record(self, attempt):
+        score, duration = attempt['score'], attempt['finished'] - attempt['started']
+        with self._transaction():
+            cursor = self._conn.execute(
+                f'INSERT INTO attempts ({", ".join(self.ATTEMPT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                tuple(bytes(attempt[c]) if c in ('choices', 'marks') else attempt[c] for c in self.ATTEMPT_COLUMNS))
+            row = self._conn.execute('SELECT best FROM user_results WHERE user_id = ? AND test_id = ?',
+                                     (attempt['user_id'], attempt['test_id'])).fetchone()
+            previous = row[0] if row else None
+            self._conn.execute("""
+                INSERT INTO user_results (user_id, test_id, test_name, attempts, best, score_sum, last, total,
+                                          first_attempt, user_name)
+                VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, test_id) DO UPDATE SET
+                    user_name = excluded.user_name, test_name = excluded.test_name, attempts = attempts + 1, best = max(best, excluded.best),
+                    score_sum = score_sum + excluded.score_sum, last = excluded.last, total = excluded.total
+            """, (attempt['user_id'], attempt['test_id'], attempt['test_name'], score, score, score,
+                  attempt['total'], cursor.lastrowid, attempt.get('user_name', '')))
+            self._conn.execute("""
+                INSERT INTO test_results (test_id, test_name, attempts, users, best, score_sum, duration_sum, total)
+                VALUES (?, ?, 1, 1, ?, ?, ?, ?)
+                ON CONFLICT (test_id) DO UPDATE SET
+                    test_name = excluded.test_name, attempts = attempts + 1, users = users + ?,
+                    best = max(best, excluded.best), score_sum = score_sum + excluded.score_sum,
+                    duration_sum = duration_sum + excluded.duration_sum, total = excluded.total
+            """, (attempt['test_id'], attempt['test_name'], score, score, duration, attempt['total'],
+                  int(previous is None)))
+        return previous
+
+    def user_results(self, user_id):
+        rows = self._conn.execute(f'SELECT {", ".join(self.USER_COLUMNS)} FROM user_results '
+                                  'WHERE user_id = ? ORDER BY first_attempt', (user_id,))
+        return [_user_summary(dict(zip(self.USER_COLUMNS, row))) for row in rows]
+
+    def test_stats(self, test_id):
+        row = self._conn.execute(f'SELECT {", ".join(self.TEST_COLUMNS)} FROM test_results WHERE test_id = ?',
+                                 (test_id,)).fetchone()
+        return _test_summary(dict(zip(self.TEST_COLUMNS, row))) if row else None
+
+    def iter_attempts(self, test_id):
+        rows = self._conn.execute(f'SELECT {", ".join(self.ATTEMPT_COLUMNS)} FROM attempts '
+                                  'WHERE test_id = ? ORDER BY id', (test_id,))
+        for row in rows:
+            yield dict(zip(self.ATTEMPT_COLUMNS, row))
+
+    def iter_choices(self, test_id):
+        rows = self._conn.execute('SELECT choices FROM attempts WHERE test_id = ? ORDER BY id', (test_id,))
+        return (choices for choices, in rows)
+
+    def last_test_id(self):
+        return self._conn.execute('SELECT coalesce(max(test_id), 0) FROM test_results').fetchone()[0]
+
+    def iter_bests(self):
+        return iter(self._conn.execute('SELECT user_id, user_name, test_id, best FROM user_results'))
+
+
+def create_result_store(url: str = None) -> ResultStore:
+    """Создает журнал попыток по адресу: 'memory' или 'sqlite:///путь/к/файлу.db'"""
+    url = url or os.getenv('RESULT_STORE', 'memory')
+    if url == 'memory':
+        return MemoryResultStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteResultStore(url[len('sqlite:///'):])
+    raise ValueError(f'Неизвестное хранилище результатов: {url}')
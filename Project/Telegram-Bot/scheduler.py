@@ -0,0 +1,87 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+# Планировщик сроков на event loop.
+# Все сроки (окончание времени на тест, простой попытки) лежат в одной куче,
+# ее разбирает единственная задача, которая спит до ближайшего срока.
+# Перенос или отмена срока не ищет запись в куче: старая запись просто
+# становится неактуальной и пропускается, а куча периодически пересобирается.
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """Сроки по ключу (например, user id) с вызовом корутины по истечении"""
+
+    def __init__(self):
+        self._heap = []     # (срок, поколение, ключ)
+        self._live = {}     # ключ -> (срок, поколение, callback)
+        self._generation = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()  # корутины истекших сроков, которые еще выполняются
+
+    def __len__(self):
+        return len(self._live)
+
+    def schedule(self, key, deadline: float, callback) -> None:
+        """Назначает или переносит срок (time.time()) для ключа; callback - корутинная функция без аргументов"""
+        generation = next(self._generation)
+        self._live[key] = (deadline, generation, callback)
+        heapq.heappush(self._heap, (deadline, generation, key))
+        if self._heap[0][1] == generation:
+            self._wakeup.set()  # новый срок раньше всех - пересчитываем время сна
+        self._compact()
+
+    def cancel(self, key) -> None:
+        self._live.pop(key, None)
+        self._compact()
+
+    def _compact(self):
+        # Неактуальных записей больше, чем актуальных - пересобираем кучу за O(n)
+        if len(self._heap) > 2 * len(self._live) + 1024:
+            self._heap = [(deadline, generation, key) for key, (deadline, generation, _) in self._live.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_expired(self, now):
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, generation, key = heapq.heappop(self._heap)
+            entry = self._live.get(key)
+            if entry is not None and entry[1] == generation:
+                del self._live[key]
+                expired.append(entry[2])
+        return expired
+
+    def _run_callback(self, callback):
+        task = asyncio.create_task(callback())
+        self._running.add(task)
+        task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка при обработке истекшего срока: {task.exception()}")
+
+    async def _run(self):
+        while True:
+            for callback in self._pop_expired(time.time()):
+                self._run_callback(callback)
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, *self._running, return_exceptions=True)
+            self._task = None
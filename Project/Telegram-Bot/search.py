@@ -0,0 +1,138 @@
+import asyncio
+import heapq
+import os
+import re
+from array import array
+from collections import Counter, defaultdict
+from functools import partial
+
+# Поиск тестов по названию и тексту вопросов.
+# Названия разбиты на триграммы (как в pg_trgm), поэтому находятся и по части слова,
+# и с опечаткой. По тексту вопросов ищутся целые слова. Для каждой триграммы и каждого
+# слова хранится массив id тестов (4 байта на запись), так что поиск перебирает только
+# тесты, в которых есть хотя бы одна триграмма или слово запроса, а не весь каталог.
+# Индекс обновляется при создании, дополнении и удалении теста; удаленные id
+# отфильтровываются при поиске и вычищаются из массивов, когда их становится много.
+# Первое построение идет частями в фоне (build), чтобы не останавливать цикл событий.
+
+SEARCH_THRESHOLD = float(os.getenv('SEARCH_THRESHOLD', '0.4'))  # доля триграмм запроса в названии
+TEXT_WEIGHT = 0.5  # вес совпадений в тексте вопросов относительно совпадения названия
+SEARCH_BUILD_BATCH = 200  # сколько тестов добавлять между передачами управления циклу событий
+
+_WORD = re.compile(r'\w+')
+
+
+def words(text: str) -> list:
+    """Слова текста в нижнем регистре, ё заменена на е"""
+    return _WORD.findall(text.lower().replace('ё', 'е'))
+
+
+def trigrams(text: str) -> set:
+    """Триграммы слов текста; слово дополняется двумя пробелами слева и одним справа"""
+    grams = set()
+    for word in words(text):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SearchIndex:
+    """Инвертированный индекс тестов: триграммы названий и слова вопросов -> id тестов"""
+
+    def __init__(self, documents=()):
+        self._names = {}   # id -> название живого теста
+        self._sizes = {}   # id -> число триграмм названия
+        self._grams = defaultdict(partial(array, 'I'))  # триграмма -> id тестов
+        self._words = defaultdict(partial(array, 'I'))  # слово -> id тестов (id может повторяться)
+        self._dead = set()  # удаленные id, которые еще лежат в массивах
+        self._removed = None  # id, удаленные во время build(), - их не добавлять
+        self.ready = True
+        for test_id, name, texts in documents:
+            self.add(test_id, name, texts)
+
+    def __len__(self):
+        return len(self._names)
+
+    def build(self, documents, batch: int = SEARCH_BUILD_BATCH):
+        """Корутина, которая заполняет индекс из documents, отдавая управление циклу событий
+        каждые batch тестов. До ее завершения ready - False; добавлять и удалять тесты
+        в это время можно как обычно."""
+        self.ready = False
+        self._removed = set()
+        return self._fill(documents, batch)
+
+    async def _fill(self, documents, batch: int) -> None:
+        try:
+            for count, (test_id, name, texts) in enumerate(documents, 1):
+                if test_id not in self._removed:
+                    self.add(test_id, name, texts)
+                if count % batch == 0:
+                    await asyncio.sleep(0)
+        finally:
+            self._removed = None
+        self.ready = True
+
+    def add(self, test_id: int, name: str = None, texts=()) -> None:
+        """Добавляет тест с названием name или дописывает тексты вопросов к уже добавленному"""
+        if self._removed is not None and name is not None:
+            self._removed.discard(test_id)  # id занят новым тестом
+        if test_id in self._dead:
+            self._compact()  # id освободился и занят снова - старые записи не должны ему достаться
+        if name is not None and test_id not in self._names:
+            grams = trigrams(name)
+            self._names[test_id] = name
+            self._sizes[test_id] = len(grams)
+            for gram in grams:
+                self._grams[gram].append(test_id)
+        if test_id not in self._names:
+            return
+        for word in {word for text in texts for word in words(text)}:
+            self._words[word].append(test_id)
+
+    def remove(self, test_id: int) -> None:
+        if self._removed is not None:
+            self._removed.add(test_id)
+        if self._names.pop(test_id, None) is None:
+            return
+        del self._sizes[test_id]
+        self._dead.add(test_id)
+        if len(self._dead) > max(1024, len(self._names)):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Вычищает удаленные id из всех массивов - O(размер индекса), но редко"""
+        dead = self._dead
+        for postings in (self._grams, self._words):
+            for key, ids in list(postings.items()):
+                kept = array('I', (i for i in ids if i not in dead))
+                if kept:
+                    postings[key] = kept
+                else:
+                    del postings[key]
+        dead.clear()
+
+    def search(self, query: str, offset: int = 0, limit: int = 10):
+        """Ищет тесты по запросу. Возвращает (всего найдено, [(id, название)] для страницы).
+
+        Название оценивается долей триграмм запроса, найденных в нем (при равенстве выше
+        короткие названия), текст вопросов - долей слов запроса, которые в нем встречаются.
+        """
+        names = self._names
+        grams = trigrams(query)
+        hits = Counter()
+        for gram in grams:
+            ids = self._grams.get(gram)
+            if ids is not None:
+                hits.update(ids)
+        scores = {}
+        for test_id, shared in hits.items():
+            if test_id in names and shared >= SEARCH_THRESHOLD * len(grams):
+                # Вторая часть - сходство по Жаккару, чтобы точное название шло выше длинного
+                scores[test_id] = shared / len(grams) + shared / (len(grams) + self._sizes[test_id] - shared) / 10
+        query_words = set(words(query))
+        for word in query_words:
+            for test_id in set(self._words.get(word, ())):
+                if test_id in names:
+                    scores[test_id] = scores.get(test_id, 0) + TEXT_WEIGHT / len(query_words)
+        top = heapq.nsmallest(offset + limit, scores, key=lambda test_id: (-scores[test_id], test_id))
+        return len(scores), [(test_id, names[test_id]) for test_id in top[offset:]]
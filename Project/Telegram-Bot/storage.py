@@ -0,0 +1,362 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from itertools import groupby
+
+# Хранилище тестов.
+# Тест - словарь {'id', 'name', 'creator', 'time_limit', 'pool_size', 'shuffle', 'questions'},
+# вопрос - словарь {'text', 'answers', 'correct_answer', 'correct_index'}.
+# pool_size - сколько вопросов выдавать в одной попытке (None - все), shuffle - перемешивать
+# ли порядок вопросов и вариантов ответа в каждой попытке.
+# Оба бэкенда держат индексы по имени и по создателю, поэтому поиск,
+# список тестов пользователя и удаление не перебирают все тесты.
+# id тестов не используются повторно: по ним записаны результаты и собраны кнопки,
+# и удаленный тест не должен передать их новому.
+
+
+class TestStore:
+    """Базовый интерфейс хранилища тестов"""
+
+    def create(self, name: str, creator: int, time_limit=None):
+        """Создает пустой тест. Возвращает id или None, если имя занято"""
+        raise NotImplementedError
+
+    def get(self, name: str):
+        """Возвращает тест целиком или None"""
+        raise NotImplementedError
+
+    def get_name(self, test_id: int):
+        """Возвращает имя теста по id или None"""
+        raise NotImplementedError
+
+    def get_id(self, name: str):
+        """Возвращает id теста по имени или None"""
+        raise NotImplementedError
+
+    def get_question(self, name: str, index: int):
+        """Возвращает один вопрос теста или None"""
+        raise NotImplementedError
+
+    def question_count(self, name: str) -> int:
+        raise NotImplementedError
+
+    def iter_questions(self, name: str):
+        """Вопросы теста по одному, не загружая весь тест в память"""
+        raise NotImplementedError
+
+    def exists(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def names(self) -> list:
+        """Имена всех тестов в порядке создания"""
+        raise NotImplementedError
+
+    def catalog(self) -> list:
+        """Пары (id, имя) всех тестов в порядке создания"""
+        raise NotImplementedError
+
+    def by_creator(self, creator: int) -> list:
+        """Имена тестов пользователя в порядке создания"""
+        raise NotImplementedError
+
+    def iter_documents(self):
+        """Тройки (id, имя, [тексты вопросов]) всех тестов по одной - для поискового индекса"""
+        raise NotImplementedError
+
+    def set_time_limit(self, name: str, time_limit: int) -> None:
+        raise NotImplementedError
+
+    def set_randomization(self, name: str, pool_size, shuffle: bool) -> None:
+        """Задает размер пула вопросов на попытку (None - все вопросы) и перемешивание"""
+        raise NotImplementedError
+
+    def add_questions(self, name: str, questions) -> None:
+        """Добавляет вопросы (список или итератор) в конец теста одной транзакцией"""
+        raise NotImplementedError
+
+    def delete(self, name: str, creator: int) -> bool:
+        """Удаляет тест, если его создал creator. Возвращает True при успехе"""
+        raise NotImplementedError
+
+    def reserve_ids(self, last_id: int) -> None:
+        """Новые тесты получат id больше last_id (например, последнего id в журнале результатов)"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryTestStore(TestStore):
+    """Хранилище в памяти процесса"""
+
+    def __init__(self):
+        self._tests = {}       # имя -> тест (dict сохраняет порядок создания)
+        self._names = {}       # id -> имя
+        self._by_creator = {}  # создатель -> {имя: None}
+        self._next_id = 1
+
+    def create(self, name, creator, time_limit=None):
+        if name in self._tests:
+            return None
+        test_id = self._next_id
+        self._next_id += 1
+        self._tests[name] = {'id': test_id, 'name': name, 'creator': creator,
+                             'time_limit': time_limit, 'pool_size': None, 'shuffle': False, 'questions': []}
+        self._names[test_id] = name
+        self._by_creator.setdefault(creator, {})[name] = None
+        return test_id
+
+    def get(self, name):
+        return self._tests.get(name)
+
+    def get_name(self, test_id):
+        return self._names.get(test_id)
+
+    def get_id(self, name):
+        test = self._tests.get(name)
+        return test['id'] if test else None
+
+    def get_question(self, name, index):
+        test = self._tests.get(name)
+        if test is None or not 0 <= index < len(test['questions']):
+            return None
+        return test['questions'][index]
+
+    def question_count(self, name):
+        test = self._tests.get(name)
+        return len(test['questions']) if test else 0
+
+    def iter_questions(self, name):
+        return iter(self._tests[name]['questions'])
+
+    def exists(self, name):
+        return name in self._tests
+
+    def names(self):
+        return list(self._tests)
+
+    def catalog(self):
+        return [(test['id'], name) for name, test in self._tests.items()]
+
+    def by_creator(self, creator):
+        return list(self._by_creator.get(creator, ()))
+
+    def iter_documents(self):
+        # Снимок списка: пока индекс строится частями, тесты могут создаваться и удаляться
+        for name, test in list(self._tests.items()):
+            yield test['id'], name, [question['text'] for question in test['questions']]
+
+    def set_time_limit(self, name, time_limit):
+        self._tests[name]['time_limit'] = time_limit
+
+    def set_randomization(self, name, pool_size, shuffle):
+        self._tests[name].update(pool_size=pool_size, shuffle=shuffle)
+
+    def add_questions(self, name, questions):
+        self._tests[name]['questions'].extend(questions)
+
+    def delete(self, name, creator):
+        test = self._tests.get(name)
+        if test is None or test['creator'] != creator:
+            return False
+        del self._tests[name]
+        del self._names[test['id']]
+        owned = self._by_creator[creator]
+        del owned[name]
+        if not owned:
+            del self._by_creator[creator]
+        return True
+
+    def reserve_ids(self, last_id):
+        self._next_id = max(self._next_id, last_id + 1)
+
+    def __len__(self):
+        return len(self._tests)
+
+
+class SQLiteTestStore(TestStore):
+    """Хранилище в SQLite: переживает перезапуск и доступно нескольким процессам бота"""
+
+    # AUTOINCREMENT: без него SQLite выдает новому тесту id удаленного последнего
+    TESTS_TABLE = """
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            creator INTEGER NOT NULL,
+            time_limit INTEGER,
+            pool_size INTEGER,
+            shuffle INTEGER NOT NULL DEFAULT 0
+        );
+    """
+    SCHEMA = TESTS_TABLE.format(name='tests') + """
+        CREATE INDEX IF NOT EXISTS tests_creator ON tests (creator);
+        CREATE TABLE IF NOT EXISTS questions (
+            test_id INTEGER NOT NULL REFERENCES tests (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            answers TEXT NOT NULL,
+            correct INTEGER NOT NULL,
+            PRIMARY KEY (test_id, position)
+        );
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute('PRAGMA foreign_keys = ON')
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.executescript(self.SCHEMA)
+        # Базы, созданные до появления пула вопросов и перемешивания
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(tests)')}
+        if 'pool_size' not in columns:
+            self._conn.execute('ALTER TABLE tests ADD COLUMN pool_size INTEGER')
+            self._conn.execute('ALTER TABLE tests ADD COLUMN shuffle INTEGER NOT NULL DEFAULT 0')
+        # Базы, где id тестов еще могли использоваться повторно
+        table = self._conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tests'").fetchone()
+        if 'AUTOINCREMENT' not in table[0].upper():
+            self._migrate_autoincrement()
+
+    def _migrate_autoincrement(self):
+        """Пересоздает таблицу tests с AUTOINCREMENT, сохраняя id и вопросы"""
+        self._conn.execute('PRAGMA foreign_keys = OFF')  # иначе DROP TABLE удалит вопросы каскадом
+        try:
+            with self._transaction():
+                self._conn.execute(self.TESTS_TABLE.format(name='tests_new'))
+                self._conn.execute('INSERT INTO tests_new (id, name, creator, time_limit, pool_size, shuffle) '
+                                   'SELECT id, name, creator, time_limit, pool_size, shuffle FROM tests')
+                self._conn.execute('DROP TABLE tests')
+                self._conn.execute('ALTER TABLE tests_new RENAME TO tests')
+                self._conn.execute('CREATE INDEX IF NOT EXISTS tests_creator ON tests (creator)')
+        finally:
+            self._conn.execute('PRAGMA foreign_keys = ON')
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, при исключении - ROLLBACK"""
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def _test_id(self, name):
+        row = self._conn.execute('SELECT id FROM tests WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _question(row):
+        text, answers, correct = row
+        answers = json.loads(answers)
+        return {'text': text, 'answers': answers, 'correct_answer': answers[correct], 'correct_index': correct}
+
+    def create(self, name, creator, time_limit=None):
+        try:
+            with self._transaction():
+                cursor = self._conn.execute(
+                    'INSERT INTO tests (name, creator, time_limit) VALUES (?, ?, ?)', (name, creator, time_limit))
+        except sqlite3.IntegrityError:
+            return None
+        return cursor.lastrowid
+
+    def get(self, name):
+        row = self._conn.execute('SELECT id, creator, time_limit, pool_size, shuffle FROM tests WHERE name = ?',
+                                 (name,)).fetchone()
+        if row is None:
+            return None
+        test_id, creator, time_limit, pool_size, shuffle = row
+        questions = self._conn.execute(
+            'SELECT text, answers, correct FROM questions WHERE test_id = ? ORDER BY position', (test_id,))
+        return {'id': test_id, 'name': name, 'creator': creator, 'time_limit': time_limit,
+                'pool_size': pool_size, 'shuffle': bool(shuffle),
+                'questions': [self._question(q) for q in questions]}
+
+    def get_name(self, test_id):
+        row = self._conn.execute('SELECT name FROM tests WHERE id = ?', (test_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_id(self, name):
+        return self._test_id(name)
+
+    def get_question(self, name, index):
+        row = self._conn.execute(
+            'SELECT q.text, q.answers, q.correct FROM questions q JOIN tests t ON t.id = q.test_id '
+            'WHERE t.name = ? AND q.position = ?', (name, index)).fetchone()
+        return self._question(row) if row else None
+
+    def question_count(self, name):
+        row = self._conn.execute(
+            'SELECT count(*) FROM questions q JOIN tests t ON t.id = q.test_id WHERE t.name = ?', (name,)).fetchone()
+        return row[0]
+
+    def iter_questions(self, name):
+        cursor = self._conn.execute(
+            'SELECT q.text, q.answers, q.correct FROM questions q JOIN tests t ON t.id = q.test_id '
+            'WHERE t.name = ? ORDER BY q.position', (name,))
+        return (self._question(row) for row in cursor)
+
+    def exists(self, name):
+        return self._test_id(name) is not None
+
+    def names(self):
+        return [row[0] for row in self._conn.execute('SELECT name FROM tests ORDER BY id')]
+
+    def catalog(self):
+        return self._conn.execute('SELECT id, name FROM tests ORDER BY id').fetchall()
+
+    def by_creator(self, creator):
+        return [row[0] for row in self._conn.execute(
+            'SELECT name FROM tests WHERE creator = ? ORDER BY id', (creator,))]
+
+    def iter_documents(self):
+        # Один проход по всем вопросам вместо запроса на каждый тест
+        rows = self._conn.execute('SELECT t.id, t.name, q.text FROM tests t LEFT JOIN questions q ON q.test_id = t.id '
+                                  'ORDER BY t.id, q.position')
+        for (test_id, name), group in groupby(rows, key=lambda row: row[:2]):
+            yield test_id, name, [text for _, _, text in group if text is not None]
+
+    def set_time_limit(self, name, time_limit):
+        with self._transaction():
+            self._conn.execute('UPDATE tests SET time_limit = ? WHERE name = ?', (time_limit, name))
+
+    def set_randomization(self, name, pool_size, shuffle):
+        with self._transaction():
+            self._conn.execute('UPDATE tests SET pool_size = ?, shuffle = ? WHERE name = ?',
+                               (pool_size, int(shuffle), name))
+
+    def add_questions(self, name, questions):
+        with self._transaction():
+            test_id = self._test_id(name)
+            start = self._conn.execute(
+                'SELECT coalesce(max(position) + 1, 0) FROM questions WHERE test_id = ?', (test_id,)).fetchone()[0]
+            self._conn.executemany(
+                'INSERT INTO questions (test_id, position, text, answers, correct) VALUES (?, ?, ?, ?, ?)',
+                ((test_id, start + i, q['text'], json.dumps(q['answers'], ensure_ascii=False),
+                  q['correct_index']) for i, q in enumerate(questions)))
+
+    def delete(self, name, creator):
+        with self._transaction():
+            cursor = self._conn.execute('DELETE FROM tests WHERE name = ? AND creator = ?', (name, creator))
+        return cursor.rowcount > 0
+
+    def reserve_ids(self, last_id):
+        with self._transaction():
+            # sqlite_sequence хранит последний выданный id таблицы с AUTOINCREMENT
+            self._conn.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'tests'", (last_id,))
+            self._conn.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'tests', ? "
+                               "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'tests')", (last_id,))
+
+    def __len__(self):
+        return self._conn.execute('SELECT count(*) FROM tests').fetchone()[0]
+
+
+def create_store(url: str = None) -> TestStore:
+    """Создает хранилище по адресу: 'memory' или 'sqlite:///путь/к/файлу.db'"""
+    url = url or os.getenv('TEST_STORE', 'memory')
+    if url == 'memory':
+        return MemoryTestStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteTestStore(url[len('sqlite:///'):])
+    raise ValueError(f'Неизвестное хранилище тестов: {url}')
@@ -0,0 +1,23 @@
+import redis.asyncio as aioredis
+
+import metrics
+
+# Клиент Redis с замером времени команд для /metrics.
+# Отдельный модуль, чтобы redis импортировался только вместе с первым клиентом (auth_client.get_redis).
+
+
+class TimedPipeline(aioredis.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        with metrics.REDIS_SECONDS.time('PIPELINE'):
+            return await super().execute(raise_on_error)
+
+
+class TimedRedis(aioredis.Redis):
+    """Клиент Redis, который записывает время каждой команды и pipeline в метрики"""
+
+    async def execute_command(self, *args, **options):
+        with metrics.REDIS_SECONDS.time(str(args[0]).upper()):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
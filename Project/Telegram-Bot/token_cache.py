@@ -0,0 +1,140 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from collections import OrderedDict
+
+# Кэш сессий авторизации и локальная проверка JWT.
+# Сессия (JWT от модуля авторизации или анонимный токен) лежит в Redis под ключом
+# chat id с TTL, поэтому брошенные сессии исчезают сами. Перед Redis стоит LRU в памяти
+# процесса с коротким сроком жизни записей, а подпись и срок действия JWT проверяются
+# здесь же по общему с модулем авторизации секрету - админ-команде не нужен ни Redis,
+# ни запрос к серверу, пока сессия в кэше.
+
+AUTH_SESSION_TTL = int(os.getenv('AUTH_SESSION_TTL', '3600'))     # TTL сессии в Redis, секунды
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))    # сколько сессий держать в памяти
+TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', '60'))       # сколько доверять копии в памяти
+JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')                      # тот же, что у модуля авторизации
+JWT_LEEWAY = 30  # допустимое расхождение часов с модулем авторизации, секунды
+
+_MISSING = object()
+
+
+def _b64decode(part: str) -> bytes:
+    return base64.urlsafe_b64decode(part + '=' * (-len(part) % 4))
+
+
+def verify_jwt(token: str, secret: str = JWT_SECRET_KEY, now: float = None):
+    """Проверяет подпись HS256 и срок действия JWT. Возвращает claims или None"""
+    if not secret:
+        return None
+    try:
+        header, payload, signature = token.split('.')
+        if json.loads(_b64decode(header)).get('alg') != 'HS256':
+            return None
+        expected = hmac.new(secret.encode(), f'{header}.{payload}'.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        claims = json.loads(_b64decode(payload))
+        now = time.time() if now is None else now
+        if not isinstance(claims, dict) or ('exp' in claims and claims['exp'] + JWT_LEEWAY < now):
+            return None
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return claims
+
+
+def sign_jwt(claims: dict, secret: str = JWT_SECRET_KEY) -> str:
+    """Подписывает claims как HS256 JWT тем же секретом, что и модуль авторизации"""
+    def encode(data):
+        raw = json.dumps(data, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+    signing_input = f'{encode({"alg": "HS256", "typ": "JWT"})}.{encode(claims)}'
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f'{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b"=").decode()}'
+
+
+class TTLCache:
+    """LRU в памяти процесса, у каждой записи свой срок жизни"""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self._max_size = max_size
+        self._items = OrderedDict()  # ключ -> (истекает в time.monotonic(), значение)
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        item = self._items.get(key)
+        if item is None:
+            return default
+        if item[0] <= time.monotonic():
+            del self._items[key]
+            return default
+        self._items.move_to_end(key)
+        return item[1]
+
+    def set(self, key, value, ttl: float) -> None:
+        self._items[key] = (time.monotonic() + ttl, value)
+        self._items.move_to_end(key)
+        if len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key) -> None:
+        self._items.pop(key, None)
+
+
+class SessionCache:
+    """Сессии авторизации: Redis с TTL и кэш в памяти перед ним"""
+
+    def __init__(self, redis, ttl: int = AUTH_SESSION_TTL, local_ttl: float = TOKEN_CACHE_TTL,
+                 max_size: int = TOKEN_CACHE_SIZE, secret: str = JWT_SECRET_KEY):
+        self._redis = redis
+        self._ttl = ttl
+        self._local_ttl = local_ttl
+        self._secret = secret
+        self._sessions = TTLCache(max_size)  # chat id -> сессия или None (сессии нет)
+        self._claims = TTLCache(max_size)    # JWT -> проверенные claims
+
+    async def get(self, chat_id):
+        """Сессия пользователя или None"""
+        value = self._sessions.get(chat_id, _MISSING)
+        if value is _MISSING:
+            value = await self._redis.get(chat_id)
+            if isinstance(value, bytes):
+                value = value.decode()
+            self._sessions.set(chat_id, value, self._local_ttl)
+        return value
+
+    async def set(self, chat_id, value: str, ttl: int = None) -> None:
+        ttl = max(1, int(ttl or self._ttl))
+        await self._redis.set(chat_id, value, ex=ttl)
+        self._sessions.set(chat_id, value, min(ttl, self._local_ttl))
+
+    async def delete(self, chat_id) -> None:
+        await self._redis.delete(chat_id)
+        self._sessions.pop(chat_id)
+
+    def claims(self, token: str):
+        """Claims проверенного JWT или None; результат проверки кэшируется до истечения токена"""
+        claims = self._claims.get(token, _MISSING)
+        if claims is _MISSING:
+            claims = verify_jwt(token, self._secret)
+            ttl = self._local_ttl
+            if claims is not None and 'exp' in claims:
+                ttl = min(ttl, claims['exp'] + JWT_LEEWAY - time.time())
+            if ttl > 0:
+                self._claims.set(token, claims, ttl)
+        return claims
+
+    def roles(self, session) -> list:
+        """Роли из действующего JWT сессии; пустой список, если сессии или подписи нет"""
+        if not session or session.count('.') != 2:
+            return []  # нет сессии или анонимная сессия из /login type=...
+        claims = self.claims(session)
+        if claims is None:
+            return []
+        roles = claims.get('roles') or [claims.get('role')]
+        return [role for role in roles if role]
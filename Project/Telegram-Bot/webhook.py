@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import signal
+from aiohttp import web
+from telegram import Update
+import auth_client
+import handlers
+import metrics
+from pipeline import UpdatePipeline
+from ratelimit import ChatRateLimiter
+
+# Вебхук-сервер: принимает обновления от Telegram, отдает /metrics и управляет
+# запуском и остановкой бота. Импортируется из main.main() уже после load_dotenv().
+
+logger = logging.getLogger(__name__)
+
+# Настройки вебхук-сервера
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('PORT', '8080'))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', 'https://535c-195-93-160-12.ngrok-free.app')  # URL от ngrok
+
+# Обработчик вебхука
+async def webhook_handler(request):
+    # Только разбираем обновление и ставим в очередь: обработка идет вне запроса
+    try:
+        update = Update.de_json(await request.json(), request.app['application'].bot)
+    except Exception as e:
+        logger.error(f"Ошибка при разборе обновления: {e}")
+        return web.Response(status=200)
+    if not request.app['pipeline'].submit(update) and request.app['pipeline'].rejects:
+        return web.Response(status=503)  # Telegram повторит доставку позже
+    return web.Response(status=200)
+
+async def metrics_handler(request):
+    return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Content-Type-Options': 'nosniff'})
+
+# Настройка вебхука
+async def set_webhook(application):
+    url = f'{WEBHOOK_URL}/{application.bot.token}'
+    await application.bot.set_webhook(url)
+
+def create_webhook_app(application) -> web.Application:
+    """Создает aiohttp-приложение вебхука с конвейером обработки обновлений"""
+    app = web.Application()
+    app.router.add_post(f"/{application.bot.token}", webhook_handler)
+    app['application'] = application
+    app['pipeline'] = UpdatePipeline(application.process_update)  # Очередь и пул обработчиков
+    app.router.add_get('/metrics', metrics_handler)
+    pipeline = app['pipeline']
+    metrics.Gauge('bot_pipeline_depth', 'Обновлений в очереди конвейера', pipeline.depth)
+    for name, documentation in (('received', 'Принято обновлений'), ('processed', 'Обработано обновлений'),
+                                ('failed', 'Обновлений с ошибкой'), ('dropped', 'Сброшено обновлений')):
+        metrics.Gauge(f'bot_pipeline_{name}_total', documentation,
+                      lambda name=name: getattr(pipeline.metrics, name), kind='counter')
+    metrics.Gauge('bot_attempt_deadlines', 'Активных сроков попыток', lambda: len(handlers.deadlines))
+    rate_limiter = application.bot.rate_limiter
+    if isinstance(rate_limiter, ChatRateLimiter):
+        metrics.Gauge('bot_send_merged_total', 'Сообщений, склеенных с предыдущими',
+                      lambda: rate_limiter.merged, kind='counter')
+        metrics.Gauge('bot_send_retried_total', 'Повторов отправки после 429',
+                      lambda: rate_limiter.retried, kind='counter')
+    return app
+
+async def run_bot(application):
+    """Запускает бота и вебхук-сервер и работает до SIGINT/SIGTERM"""
+    app = create_webhook_app(application)
+    runner = web.AppRunner(app)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    try:
+        await application.start()
+        app['pipeline'].start()
+        handlers.restore_attempt_deadlines(application)
+        handlers.deadlines.start()
+        handlers.start_search_index()
+        await runner.setup()
+        site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+        await site.start()
+        await set_webhook(application)
+        logger.info(f"Вебхук-сервер запущен на {WEBHOOK_HOST}:{WEBHOOK_PORT}")
+        await stop.wait()
+    finally:
+        # Сначала перестаем принимать запросы, затем дорабатываем очередь и останавливаем бота
+        logger.info("Остановка бота")
+        await runner.cleanup()
+        await app['pipeline'].stop()
+        await handlers.deadlines.stop()
+        try:
+            if application.running:
+                await application.stop()
+        finally:
+            await application.shutdown()
+            await auth_client.close()
+